@@ -4,18 +4,70 @@ End-to-end test harness for MediRota solver pipeline.
 
 Generates realistic test data, calls the solver API, and validates results
 to create a self-contained test package for analysis.
+
+Requires requests, plus numpy for the in-process validator
+(validate_solution.py); orjson is used when installed.
 """
 
 import argparse
-import json
+import gzip
 import os
+import shutil
 import sys
-import subprocess
+import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, date, timedelta
 from typing import Dict, List, Any
 import random
 
+# orjson is optional: without it JSON is encoded and parsed by the stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# validate_solution.py lives at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import validate_solution
+
+
+# Shared HTTP session so the solve and debug calls reuse one pooled connection.
+# Transient gateway errors and dropped connections are retried with back-off
+# rather than failing a whole run.
+RETRIES = Retry(
+    total=3,
+    connect=3,
+    read=3,
+    backoff_factor=0.5,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset(["GET", "POST"]),
+    raise_on_status=False
+)
+SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(max_retries=RETRIES, pool_connections=4, pool_maxsize=8)
+SESSION.mount("http://", _ADAPTER)
+SESSION.mount("https://", _ADAPTER)
+
+# Skill requirements per (ward, weekday/weekend, shift code).
+# WardA (Emergency) needs general cover; WardB (Radiology) needs specialists,
+# and both run reduced demand at weekends.
+DEMAND_REQUIREMENTS = {
+    ("WardA", "wk", "DAY"): {"General": 2, "MRI": 1},
+    ("WardA", "wk", "EVENING"): {"General": 2},
+    ("WardA", "wk", "NIGHT"): {"General": 1},
+    ("WardA", "we", "DAY"): {"General": 1},
+    ("WardA", "we", "EVENING"): {"General": 1},
+    ("WardA", "we", "NIGHT"): {"General": 1},
+    ("WardB", "wk", "DAY"): {"MRI": 1, "XRay": 1},
+    ("WardB", "wk", "EVENING"): {"XRay": 1},
+    ("WardB", "wk", "NIGHT"): {"MRI": 1},
+    ("WardB", "we", "DAY"): {"MRI": 1},
+    ("WardB", "we", "EVENING"): {"XRay": 1},
+    ("WardB", "we", "NIGHT"): {"XRay": 1},
+}
+
 
 def generate_test_payload() -> Dict[str, Any]:
     """Generate a realistic test JSON payload for the solver."""
@@ -96,108 +148,20 @@ def generate_test_payload() -> Dict[str, Any]:
         })
     
     # Generate demand for each day
-    demand = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        date_str = current_date.isoformat()
-        
-        # WardA demand (Emergency - more general skills needed)
-        for shift in shift_types:
-            # Vary demand based on day of week and shift
-            if current_date.weekday() < 5:  # Weekdays
-                if shift["code"] == "DAY":
-                    demand.append({
-                        "wardId": "WardA",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"General": 2, "MRI": 1}
-                    })
-                elif shift["code"] == "EVENING":
-                    demand.append({
-                        "wardId": "WardA",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"General": 2}
-                    })
-                else:  # NIGHT
-                    demand.append({
-                        "wardId": "WardA",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"General": 1}
-                    })
-            else:  # Weekends - reduced demand
-                if shift["code"] == "DAY":
-                    demand.append({
-                        "wardId": "WardA",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"General": 1}
-                    })
-                elif shift["code"] == "EVENING":
-                    demand.append({
-                        "wardId": "WardA",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"General": 1}
-                    })
-                else:  # NIGHT
-                    demand.append({
-                        "wardId": "WardA",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"General": 1}
-                    })
-        
-        # WardB demand (Radiology - more specialized skills)
-        for shift in shift_types:
-            if current_date.weekday() < 5:  # Weekdays
-                if shift["code"] == "DAY":
-                    demand.append({
-                        "wardId": "WardB",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"MRI": 1, "XRay": 1}
-                    })
-                elif shift["code"] == "EVENING":
-                    demand.append({
-                        "wardId": "WardB",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"XRay": 1}
-                    })
-                else:  # NIGHT
-                    demand.append({
-                        "wardId": "WardB",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"MRI": 1}
-                    })
-            else:  # Weekends - minimal radiology demand
-                if shift["code"] == "DAY":
-                    demand.append({
-                        "wardId": "WardB",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"MRI": 1}
-                    })
-                elif shift["code"] == "EVENING":
-                    demand.append({
-                        "wardId": "WardB",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"XRay": 1}
-                    })
-                else:  # NIGHT
-                    demand.append({
-                        "wardId": "WardB",
-                        "date": date_str,
-                        "slot": shift["code"],
-                        "requirements": {"XRay": 1}
-                    })
-        
-        current_date += timedelta(days=1)
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    day_strs = [day.isoformat() for day in days]
+    day_buckets = ["wk" if day.weekday() < 5 else "we" for day in days]
+    demand = [
+        {
+            "wardId": ward_id,
+            "date": day_str,
+            "slot": code,
+            "requirements": DEMAND_REQUIREMENTS[(ward_id, bucket, code)]
+        }
+        for day_str, bucket in zip(day_strs, day_buckets)
+        for ward_id in ("WardA", "WardB")
+        for code in ("DAY", "EVENING", "NIGHT")
+    ]
     
     # Build the complete payload
     payload = {
@@ -224,64 +188,98 @@ def generate_test_payload() -> Dict[str, Any]:
     return payload
 
 
-def call_solver_api(payload: Dict[str, Any], api_url: str) -> Dict[str, Any]:
-    """Call the solver API with the test payload."""
+def _json_bytes(obj: Any, pretty: bool = False) -> bytes:
+    """Encode an object as UTF-8 JSON, compact unless pretty is True."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode()
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def _dump(obj: Any, path: str, pretty: bool = True) -> None:
+    """Write an object to disk as JSON, indented unless pretty is False."""
+    with open(path, 'wb') as f:
+        f.write(_json_bytes(obj, pretty))
+
+
+def _pretty_print_file(path: str) -> None:
+    """Re-indent a compact JSON file in place (`jq . file` works just as well)."""
+    with open(path, 'rb') as f:
+        data = (orjson.loads if orjson is not None else json.loads)(f.read())
+    _dump(data, path)
+
+
+def save_solver_response_stream(payload: Dict[str, Any], api_url: str, out_path: str) -> None:
+    """Call the solver API and stream the response body straight to disk."""
     print(f"Calling solver API at {api_url}...")
     
     try:
-        response = requests.post(
+        # Demand rows repeat the same keys, so the body compresses very well
+        body = gzip.compress(_json_bytes(payload), compresslevel=3)
+        with SESSION.post(
             api_url,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=600  # 10 minute timeout
-        )
-        response.raise_for_status()
-        return response.json()
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                "Content-Encoding": "gzip",
+                "Accept-Encoding": "gzip"
+            },
+            timeout=600,  # 10 minute timeout
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            # Undo any Content-Encoding while copying the raw socket stream
+            response.raw.decode_content = True
+            with open(out_path, 'wb') as f:
+                shutil.copyfileobj(response.raw, f, length=1 << 20)
     except requests.exceptions.RequestException as e:
         print(f"ERROR: Failed to call solver API: {e}")
         sys.exit(1)
 
 
-def get_solver_debug_info(debug_url: str) -> Dict[str, Any]:
-    """Get the solver's debug information."""
+def save_debug_stream(debug_url: str, out_path: str) -> None:
+    """Stream the solver's debug information straight to disk."""
     print("Getting solver debug information...")
     
     try:
-        response = requests.get(debug_url, timeout=30)
-        response.raise_for_status()
-        return response.json()
+        with SESSION.get(
+            debug_url,
+            headers={"Accept-Encoding": "gzip"},
+            timeout=30,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            with open(out_path, 'wb') as f:
+                shutil.copyfileobj(response.raw, f, length=1 << 20)
     except requests.exceptions.RequestException as e:
         print(f"WARNING: Failed to get debug info: {e}")
-        return {"error": str(e)}
+        _dump({"error": str(e)}, out_path, pretty=False)
 
 
 def run_validator(request_path: str, response_path: str, outdir: str) -> str:
-    """Run the validation script and capture output."""
+    """Run the validator in-process and capture its report."""
     print("Running validator...")
     
+    # Create CSV subdirectory
+    csv_dir = os.path.join(outdir, "csv")
+    os.makedirs(csv_dir, exist_ok=True)
+    
     try:
-        # Create CSV subdirectory
-        csv_dir = os.path.join(outdir, "csv")
-        os.makedirs(csv_dir, exist_ok=True)
-        
-        # Run the validator
-        result = subprocess.run([
-            sys.executable, "validate_solution.py",
-            "--request", request_path,
-            "--response", response_path,
-            "--outdir", csv_dir
-        ], capture_output=True, text=True, cwd=".")
-        
-        if result.returncode not in [0, 2]:  # 0=success, 2=unmet demand (expected)
-            print(f"ERROR: Validator failed with return code {result.returncode}")
-            print(f"STDOUT: {result.stdout}")
-            print(f"STDERR: {result.stderr}")
-            sys.exit(1)
-        
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"ERROR: Failed to run validator: {e}")
+        code, output = validate_solution.run(request_path, response_path, csv_dir)
+    except SystemExit as e:
+        # The validator's partial report has already been written to stdout
+        code = e.code
+    except Exception as e:
+        print(f"ERROR: Failed to run validator: {e!r}")
         sys.exit(1)
+    
+    if code not in [0, 2]:  # 0=success, 2=unmet demand (expected)
+        print(f"ERROR: Validator failed with return code {code}")
+        sys.exit(1)
+    
+    return output
 
 
 def create_schedule_in_backend(schedule_id: str) -> bool:
@@ -296,6 +294,8 @@ def main():
     parser.add_argument('--api-url', default='http://localhost:8090/solve_full', help='Solver API URL')
     parser.add_argument('--debug-url', default='http://localhost:8090/_debug/last', help='Solver debug URL')
     parser.add_argument('--schedule', default='sched-demo-14d', help='Schedule ID to use for testing')
+    parser.add_argument('--pretty', action='store_true',
+                        help='Indent the response and debug JSON (compact by default; use jq to pretty-print later)')
     
     args = parser.parse_args()
     
@@ -318,26 +318,21 @@ def main():
     
     # Save request JSON
     request_path = os.path.join(args.outdir, "solver_request.json")
-    with open(request_path, 'w') as f:
-        json.dump(payload, f, indent=2)
+    _dump(payload, request_path)
     print(f"✅ Saved request to: {request_path}")
     
-    # Step 2: Call solver API
-    response_data = call_solver_api(payload, args.api_url)
-    
-    # Save response JSON
+    # Step 2: Call solver API and save response JSON
     response_path = os.path.join(args.outdir, "solver_response.json")
-    with open(response_path, 'w') as f:
-        json.dump(response_data, f, indent=2)
+    save_solver_response_stream(payload, args.api_url, response_path)
+    if args.pretty:
+        _pretty_print_file(response_path)
     print(f"✅ Saved response to: {response_path}")
     
-    # Step 3: Get debug information
-    debug_data = get_solver_debug_info(args.debug_url)
-    
-    # Save debug JSON
+    # Step 3: Get debug information and save debug JSON
     debug_path = os.path.join(args.outdir, "solver_debug_last.json")
-    with open(debug_path, 'w') as f:
-        json.dump(debug_data, f, indent=2)
+    save_debug_stream(args.debug_url, debug_path)
+    if args.pretty:
+        _pretty_print_file(debug_path)
     print(f"✅ Saved debug info to: {debug_path}")
     
     # Step 4: Run validator
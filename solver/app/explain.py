@@ -3,15 +3,97 @@ Explain module for rota assignments
 Provides rationale for assignments and alternative options
 """
 
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+import math
+import weakref
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple, FrozenSet
+from datetime import date
 import numpy as np
 
 from .models import (
     AssignmentModel, ExplainReasonModel, ExplainAlternativeModel, 
-    ExplainResponseModel, SolverRequestModel
+    ExplainResponseModel, SolverRequestModel, StaffModel, ShiftTypeModel, DemandModel
 )
 
+@dataclass
+class _RequestIndex:
+    """Request-wide lookups shared by every explain call on the same request"""
+    staff_by_id: Dict[str, StaffModel]
+    staff_idx: Dict[str, int]
+    shift_by_id: Dict[str, ShiftTypeModel]
+    demand_by_cell: Dict[Tuple[str, str, str], List[DemandModel]]
+    night_codes: FrozenSet[str]
+    skills_by_staff: Dict[str, FrozenSet[str]]
+    wards_by_staff: Dict[str, FrozenSet[str]]
+    # Staff as parallel arrays: ids plus one boolean column per skill and ward
+    staff_ids: np.ndarray
+    skill_mask: Dict[str, np.ndarray]
+    ward_mask: Dict[str, np.ndarray]
+    
+    @classmethod
+    def build(cls, request: SolverRequestModel) -> "_RequestIndex":
+        demand_by_cell = defaultdict(list)
+        for demand in request.demand:
+            demand_by_cell[(demand.wardId, demand.date, demand.slot)].append(demand)
+        n_staff = len(request.staff)
+        skill_mask = defaultdict(lambda: np.zeros(n_staff, dtype=bool))
+        ward_mask = defaultdict(lambda: np.zeros(n_staff, dtype=bool))
+        for i, staff in enumerate(request.staff):
+            for skill in staff.skills:
+                skill_mask[skill][i] = True
+            for ward_id in staff.eligibleWards:
+                ward_mask[ward_id][i] = True
+        return cls(
+            staff_by_id={staff.id: staff for staff in request.staff},
+            staff_idx={staff.id: i for i, staff in enumerate(request.staff)},
+            shift_by_id={st.id: st for st in request.shiftTypes},
+            demand_by_cell=demand_by_cell,
+            night_codes=request.night_shift_codes,
+            skills_by_staff={staff.id: staff.skill_set for staff in request.staff},
+            wards_by_staff={staff.id: staff.eligible_ward_set for staff in request.staff},
+            staff_ids=np.array([staff.id for staff in request.staff], dtype=object),
+            skill_mask=dict(skill_mask),
+            ward_mask=dict(ward_mask),
+        )
+
+# Keyed by id(request); entries are dropped when the request is garbage collected.
+# A WeakValueDictionary would not work here as nothing else holds the index alive.
+_INDEX_CACHE: Dict[int, _RequestIndex] = {}
+
+def _index(request: SolverRequestModel) -> _RequestIndex:
+    """Return the cached index for a request, building it on first use"""
+    key = id(request)
+    idx = _INDEX_CACHE.get(key)
+    if idx is None:
+        idx = _RequestIndex.build(request)
+        _INDEX_CACHE[key] = idx
+        weakref.finalize(request, _INDEX_CACHE.pop, key, None)
+    return idx
+
+@lru_cache(maxsize=4096)
+def _date_ordinal(date_str: str) -> int:
+    """Ordinal of an ISO date string; each distinct date is parsed once"""
+    return date.fromisoformat(date_str).toordinal()
+
+def _population_std(n: int, total: int, total_sq: int) -> float:
+    """Population standard deviation from count, sum and sum of squares"""
+    if not n:
+        return 0.0
+    return math.sqrt(max(n * total_sq - total * total, 0)) / n
+
+def _mk_reason(type: str, description: str, weight: float) -> ExplainReasonModel:
+    """Build a reason without re-validating fields the explainer already controls"""
+    return ExplainReasonModel.model_construct(type=type, description=description, weight=weight)
+
+def _mk_alternative(staffId: str, why: str, fairnessDelta: float,
+                    riskBreaches: List[str]) -> ExplainAlternativeModel:
+    """Build an alternative without re-validating fields the explainer already controls"""
+    return ExplainAlternativeModel.model_construct(
+        staffId=staffId, why=why, fairnessDelta=fairnessDelta, riskBreaches=riskBreaches
+    )
+
 class RotaExplainer:
     """Explains rota assignments and provides alternatives"""
     
@@ -24,56 +106,53 @@ class RotaExplainer:
         reasons = []
         alternatives = []
         
+        self._prepare(request, all_assignments)
+        
         # Find the assigned staff
-        assigned_staff = None
-        for staff in request.staff:
-            if staff.id == assignment.staffId:
-                assigned_staff = staff
-                break
+        idx = _index(request)
+        assigned_staff = idx.staff_by_id.get(assignment.staffId)
         
         if not assigned_staff:
             return ExplainResponseModel(reasons=[], alternatives=[])
         
         # Reason 1: Skill match
-        shift_type = None
-        for st in request.shiftTypes:
-            if st.id == assignment.shiftTypeId:
-                shift_type = st
-                break
+        shift_type = idx.shift_by_id.get(assignment.shiftTypeId)
         
         if shift_type:
             # Check what skills are needed for this assignment
-            required_skills = []
-            for demand in request.demand:
-                if (demand.wardId == assignment.wardId and 
-                    demand.date == assignment.date and 
-                    demand.slot == assignment.slot):
-                    required_skills.extend(demand.requirements.keys())
+            required_skills = [
+                skill
+                for demand in idx.demand_by_cell.get((assignment.wardId, assignment.date, assignment.slot), ())
+                for skill in demand.requirements
+            ]
             
-            matching_skills = [skill for skill in required_skills if skill in assigned_staff.skills]
+            matching_skills = [skill for skill in required_skills if skill in assigned_staff.skill_set]
             if matching_skills:
-                reasons.append(ExplainReasonModel(
+                reasons.append(_mk_reason(
                     type="skill_match",
                     description=f"Staff has required skills: {', '.join(matching_skills)}",
                     weight=0.8
                 ))
         
         # Reason 2: Ward eligibility
-        if assignment.wardId in assigned_staff.eligibleWards:
-            reasons.append(ExplainReasonModel(
+        if assignment.wardId in assigned_staff.eligible_ward_set:
+            reasons.append(_mk_reason(
                 type="ward_eligibility",
                 description=f"Staff is eligible for {assignment.wardId}",
                 weight=0.6
             ))
         
         # Reason 3: Fairness consideration
-        night_shifts_per_staff = self._count_night_shifts(all_assignments, request)
-        if assignment.slot in [st.code for st in request.shiftTypes if st.isNight]:
-            staff_night_count = night_shifts_per_staff.get(assignment.staffId, 0)
-            avg_night_count = np.mean(list(night_shifts_per_staff.values())) if night_shifts_per_staff else 0
+        night_counts = self._count_night_shifts(request).tolist()
+        night_stats = self._night_stats(night_counts)
+        if assignment.slot in idx.night_codes:
+            staff_night_count = night_counts[idx.staff_idx[assignment.staffId]]
+            # Average over staff who have worked at least one night
+            worked_staff, total_nights, _ = night_stats
+            avg_night_count = total_nights / worked_staff if worked_staff else 0
             
             if staff_night_count <= avg_night_count:
-                reasons.append(ExplainReasonModel(
+                reasons.append(_mk_reason(
                     type="fairness",
                     description=f"Staff has {staff_night_count} night shifts (avg: {avg_night_count:.1f})",
                     weight=0.7
@@ -84,89 +163,128 @@ class RotaExplainer:
             if (pref.staffId == assignment.staffId and 
                 pref.date == assignment.date):
                 if pref.preferOn:
-                    reasons.append(ExplainReasonModel(
+                    reasons.append(_mk_reason(
                         type="preference",
                         description="Staff preferred to work this shift",
                         weight=0.9
                     ))
                 elif pref.preferOff:
-                    reasons.append(ExplainReasonModel(
+                    reasons.append(_mk_reason(
                         type="constraint",
                         description="Staff preferred not to work but was required",
                         weight=0.3
                     ))
         
         # Find alternatives
-        alternatives = self._find_alternatives(assignment, all_assignments, request)
+        alternatives = self._find_alternatives(assignment, all_assignments, request, night_counts, night_stats)
         
         return ExplainResponseModel(reasons=reasons, alternatives=alternatives)
     
-    def _count_night_shifts(self, assignments: List[AssignmentModel], request: SolverRequestModel) -> Dict[str, int]:
-        """Count night shifts per staff"""
-        night_shifts_per_staff = {}
-        night_shift_codes = [st.code for st in request.shiftTypes if st.isNight]
-        
-        for assignment in assignments:
-            if assignment.slot in night_shift_codes:
-                night_shifts_per_staff[assignment.staffId] = night_shifts_per_staff.get(assignment.staffId, 0) + 1
-        
-        return night_shifts_per_staff
+    def _prepare(self, request: SolverRequestModel, all_assignments: List[AssignmentModel]):
+        """Index staff and assignments as arrays for vectorized counting"""
+        idx = _index(request)
+        self._staff_idx = idx.staff_idx
+        self._night_codes = idx.night_codes
+        self._shift_by_id = idx.shift_by_id
+        n = len(all_assignments)
+        self._slots = np.array([a.slot for a in all_assignments])
+        # Assignments for staff outside the request are marked -1 and never counted
+        self._sids = np.fromiter(
+            (self._staff_idx.get(a.staffId, -1) for a in all_assignments),
+            dtype=np.int32, count=n
+        )
+        self._dates_ord = np.fromiter(
+            (_date_ordinal(a.date) for a in all_assignments),
+            dtype=np.int32, count=n
+        )
+        self._is_night_slot = np.isin(self._slots, list(self._night_codes))
+        # Shift-type flags, resolved through shiftTypeId rather than slot code
+        self._known_type = np.fromiter(
+            (a.shiftTypeId in self._shift_by_id for a in all_assignments),
+            dtype=bool, count=n
+        )
+        self._night_type = np.fromiter(
+            (a.shiftTypeId in self._shift_by_id and self._shift_by_id[a.shiftTypeId].isNight
+             for a in all_assignments),
+            dtype=bool, count=n
+        )
+    
+    def _count_night_shifts(self, request: SolverRequestModel) -> np.ndarray:
+        """Count night shifts per staff, indexed by position in request.staff"""
+        night_mask = self._is_night_slot & (self._sids >= 0)
+        return np.bincount(self._sids[night_mask], minlength=len(request.staff))
+    
+    def _night_stats(self, night_counts: List[int]) -> Tuple[int, int, int]:
+        """Count, sum and sum of squares of night shifts over staff who have worked nights"""
+        worked_nights = [count for count in night_counts if count > 0]
+        return len(worked_nights), sum(worked_nights), sum(count * count for count in worked_nights)
     
     def _find_alternatives(self, 
                           assignment: AssignmentModel,
                           all_assignments: List[AssignmentModel],
-                          request: SolverRequestModel) -> List[ExplainAlternativeModel]:
+                          request: SolverRequestModel,
+                          night_counts: List[int],
+                          night_stats: Tuple[int, int, int]) -> List[ExplainAlternativeModel]:
         """Find alternative staff for this assignment"""
         alternatives = []
         
         # Find staff with required skills
-        required_skills = []
-        for demand in request.demand:
-            if (demand.wardId == assignment.wardId and 
-                demand.date == assignment.date and 
-                demand.slot == assignment.slot):
-                required_skills.extend(demand.requirements.keys())
-        
-        # Find eligible staff
-        eligible_staff = []
-        for staff in request.staff:
-            if (staff.id != assignment.staffId and  # Not the currently assigned staff
-                assignment.wardId in staff.eligibleWards and
-                any(skill in staff.skills for skill in required_skills)):
-                eligible_staff.append(staff)
-        
-        # Calculate current fairness metrics
-        current_night_shifts = self._count_night_shifts(all_assignments, request)
-        current_std = np.std(list(current_night_shifts.values())) if current_night_shifts else 0
+        idx = _index(request)
+        required_skills = set().union(
+            *(demand.requirements.keys()
+              for demand in idx.demand_by_cell.get((assignment.wardId, assignment.date, assignment.slot), ()))
+        )
+        
+        # Find eligible staff (not the currently assigned staff)
+        no_staff = np.zeros(len(request.staff), dtype=bool)
+        has_skill = no_staff.copy()
+        for skill in required_skills:
+            has_skill |= idx.skill_mask.get(skill, no_staff)
+        eligible = (
+            idx.ward_mask.get(assignment.wardId, no_staff) & has_skill &
+            (idx.staff_ids != assignment.staffId)
+        )
+        
+        # Staff already working on the target date
+        target_ord = _date_ordinal(assignment.date)
+        assigned_today = no_staff.copy()
+        on_date = (self._dates_ord == target_ord) & (self._sids >= 0)
+        assigned_today[self._sids[on_date]] = True
+        
+        # Calculate current fairness metrics over staff who have worked nights
+        worked_staff, total_nights, total_sq = night_stats
+        current_std = _population_std(worked_staff, total_nights, total_sq)
         
         # Evaluate each alternative
-        for staff in eligible_staff[:3]:  # Limit to 3 alternatives
-            # Check if this staff is already assigned on this date
-            already_assigned = any(
-                a.staffId == staff.id and a.date == assignment.date 
-                for a in all_assignments
-            )
-            
-            if already_assigned:
+        for i in np.flatnonzero(eligible)[:3]:  # Limit to 3 alternatives
+            # Skip staff already assigned on this date
+            if assigned_today[i]:
                 continue
+            staff = request.staff[i]
             
-            # Calculate fairness impact
-            alternative_night_shifts = current_night_shifts.copy()
-            if assignment.slot in [st.code for st in request.shiftTypes if st.isNight]:
+            # Calculate fairness impact by updating the running sums for the swap
+            alt_staff, alt_total, alt_sq = worked_staff, total_nights, total_sq
+            if assignment.slot in self._night_codes:
                 # Remove night shift from current staff
-                if assignment.staffId in alternative_night_shifts:
-                    alternative_night_shifts[assignment.staffId] -= 1
+                current = night_counts[self._staff_idx[assignment.staffId]]
+                if current > 0:
+                    alt_total -= 1
+                    alt_sq += (current - 1) ** 2 - current * current
                 # Add night shift to alternative staff
-                alternative_night_shifts[staff.id] = alternative_night_shifts.get(staff.id, 0) + 1
+                other = night_counts[self._staff_idx[staff.id]]
+                if other == 0:
+                    alt_staff += 1
+                alt_total += 1
+                alt_sq += (other + 1) ** 2 - other * other
             
-            alternative_std = np.std(list(alternative_night_shifts.values())) if alternative_night_shifts else 0
+            alternative_std = _population_std(alt_staff, alt_total, alt_sq)
             fairness_delta = alternative_std - current_std
             
             # Check for risk breaches
             risk_breaches = []
             
             # Check if alternative would violate one shift per day
-            if any(a.staffId == staff.id and a.date == assignment.date for a in all_assignments):
+            if assigned_today[i]:
                 risk_breaches.append("Already assigned on this date")
             
             # Check if alternative would violate rest constraints
@@ -177,9 +295,9 @@ class RotaExplainer:
             if self._would_violate_consecutive_nights(staff.id, assignment, all_assignments, request):
                 risk_breaches.append("Would violate consecutive nights limit")
             
-            alternatives.append(ExplainAlternativeModel(
+            alternatives.append(_mk_alternative(
                 staffId=staff.id,
-                why=f"Has required skills: {', '.join([s for s in staff.skills if s in required_skills])}",
+                why=f"Has required skills: {', '.join(sorted(idx.skills_by_staff[staff.id] & required_skills))}",
                 fairnessDelta=fairness_delta,
                 riskBreaches=risk_breaches
             ))
@@ -193,27 +311,22 @@ class RotaExplainer:
                            request: SolverRequestModel) -> bool:
         """Check if assignment would violate rest constraints"""
         # Simplified check - in practice you'd need proper time arithmetic
-        min_rest_hours = request.rules.minRestHours
-        
-        # Check assignments on adjacent days
-        assignment_date = datetime.strptime(assignment.date, "%Y-%m-%d")
-        
-        for other_assignment in all_assignments:
-            if other_assignment.staffId == staff_id:
-                other_date = datetime.strptime(other_assignment.date, "%Y-%m-%d")
-                days_diff = abs((assignment_date - other_date).days)
-                
-                # If assignments are on consecutive days and one is a night shift
-                if days_diff <= 1:
-                    shift_types = {st.id: st for st in request.shiftTypes}
-                    current_shift = shift_types.get(assignment.shiftTypeId)
-                    other_shift = shift_types.get(other_assignment.shiftTypeId)
-                    
-                    if current_shift and other_shift:
-                        if current_shift.isNight or other_shift.isNight:
-                            return True
-        
-        return False
+        current_shift = self._shift_by_id.get(assignment.shiftTypeId)
+        if not current_shift:
+            return False
+        
+        # Assignments on the same or adjacent days with a known shift type
+        target_ord = _date_ordinal(assignment.date)
+        nearby = (
+            (self._sids == self._staff_idx[staff_id]) &
+            (np.abs(self._dates_ord - target_ord) <= 1) &
+            self._known_type
+        )
+        
+        # Rest is at risk if either shift is a night shift
+        if current_shift.isNight:
+            return bool(nearby.any())
+        return bool((nearby & self._night_type).any())
     
     def _would_violate_consecutive_nights(self,
                                         staff_id: str,
@@ -223,27 +336,22 @@ class RotaExplainer:
         """Check if assignment would violate consecutive nights limit"""
         max_consecutive = request.rules.maxConsecutiveNights
         
-        # Get all night shift assignments for this staff
-        night_assignments = []
-        night_shift_codes = [st.code for st in request.shiftTypes if st.isNight]
-        
-        for a in all_assignments:
-            if a.staffId == staff_id and a.slot in night_shift_codes:
-                night_assignments.append(a)
+        # Get all night shift dates for this staff
+        night_mask = (self._sids == self._staff_idx[staff_id]) & self._is_night_slot
+        night_ords = self._dates_ord[night_mask]
         
         # Add the potential new assignment
-        if assignment.slot in night_shift_codes:
-            night_assignments.append(assignment)
+        if assignment.slot in self._night_codes:
+            night_ords = np.append(night_ords, _date_ordinal(assignment.date))
         
-        # Check for consecutive nights
-        if len(night_assignments) >= max_consecutive + 1:
-            dates = [datetime.strptime(a.date, "%Y-%m-%d") for a in night_assignments]
-            dates.sort()
-            
-            for i in range(len(dates) - max_consecutive):
-                consecutive_dates = dates[i:i + max_consecutive + 1]
-                if all((consecutive_dates[j+1] - consecutive_dates[j]).days == 1 
-                       for j in range(len(consecutive_dates) - 1)):
-                    return True
+        # Sorted distinct night dates; a violation is a run of max_consecutive + 1 of them
+        night_ords = np.unique(night_ords)
+        if len(night_ords) < max_consecutive + 1:
+            return False
         
-        return False
+        # Longest run of day-to-day steps, measured between the breaks in the sequence
+        consecutive = np.diff(night_ords) == 1
+        breaks = np.flatnonzero(~consecutive)
+        run_edges = np.concatenate(([-1], breaks, [len(consecutive)]))
+        longest_run = int(np.diff(run_edges).max()) - 1
+        return longest_run >= max_consecutive
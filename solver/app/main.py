@@ -11,10 +11,18 @@ Endpoints:
 - GET /healthz: Health check
 """
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.routing import APIRoute
+import argparse
+import asyncio
+import collections
+import cProfile
+import hashlib
 import time
 import uuid
+import zlib
 import json
 import logging
 from pydantic import ValidationError
@@ -31,7 +39,54 @@ from .explain import RotaExplainer
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Largest request body accepted after gzip inflation
+MAX_INFLATED_BODY = 64 * 1024 * 1024
+
+def _inflate_gzip(body: bytes) -> bytes:
+    """Inflate a (possibly multi-member) gzip body, refusing bad or oversized payloads"""
+    members = []
+    size = 0
+    try:
+        while body:
+            decompressor = zlib.decompressobj(wbits=31)
+            # One byte over the cap is enough to tell the body is too large
+            member = decompressor.decompress(body, MAX_INFLATED_BODY - size + 1)
+            size += len(member)
+            if size > MAX_INFLATED_BODY or decompressor.unconsumed_tail:
+                raise HTTPException(status_code=413, detail="Inflated request body too large")
+            if not decompressor.eof:
+                raise EOFError("truncated gzip stream")
+            members.append(member)
+            body = decompressor.unused_data
+    except (OSError, EOFError, zlib.error):
+        raise HTTPException(status_code=400, detail="Invalid gzip request body")
+    return b"".join(members)
+
+class GzipRequest(Request):
+    """Request that transparently inflates gzip-encoded bodies"""
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            if "gzip" in self.headers.getlist("Content-Encoding"):
+                body = _inflate_gzip(body)
+            self._body = body
+        return self._body
+
+class GzipRoute(APIRoute):
+    """Route class that accepts gzip-compressed request bodies"""
+
+    def get_route_handler(self):
+        original_route_handler = super().get_route_handler()
+
+        async def custom_route_handler(request: Request):
+            request = GzipRequest(request.scope, request.receive)
+            return await original_route_handler(request)
+
+        return custom_route_handler
+
 app = FastAPI(title="MediRota Solver", version="1.0.0")
+app.router.route_class = GzipRoute
 
 # Add CORS middleware
 app.add_middleware(
@@ -42,20 +97,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory debug store
-LAST = {"request": None, "response": None, "log": []}
+# Compress large responses (assignments, debug dumps) for clients that accept it
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# In-memory debug store (only the most recent log entries are kept)
+LAST = {"request": None, "response": None, "log": collections.deque(maxlen=100)}
 
 def debug_log(message: str):
     """Append message to debug log"""
     LAST["log"].append(message)
-    logger.info(f"[DEBUG] {message}")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(f"[DEBUG] {message}")
 
 # Initialize components
 solver = RotaSolverCore()
 explainer = RotaExplainer()
 
-# In-memory storage for solutions (in production, use database)
-solutions = {}
+# CP-SAT searches already use every worker thread, so run one solve at a time
+_solver_lock = asyncio.Lock()
+
+# Set by --profile: dump a cProfile of each solve to this path
+PROFILE_PATH = None
+
+def _run_solve(request: SolverRequestModel):
+    """Run the solver, profiling the call when --profile is set"""
+    if PROFILE_PATH is None:
+        return solver.solve(request)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(solver.solve, request)
+    finally:
+        profiler.dump_stats(PROFILE_PATH)
+        logger.info(f"Wrote solve profile to {PROFILE_PATH}")
+
+# In-memory storage for solutions (in production, use database); least
+# recently used entries are evicted beyond MAX_SOLUTIONS
+MAX_SOLUTIONS = 128
+solutions: "collections.OrderedDict[str, dict]" = collections.OrderedDict()
+
+def _store_solution(sid: str, request: SolverRequestModel, assignments: List[AssignmentModel]):
+    """Keep what /explain needs for a solution, evicting the oldest"""
+    solutions[sid] = {"assignments": assignments, "request": request}
+    solutions.move_to_end(sid)
+    while len(solutions) > MAX_SOLUTIONS:
+        solutions.popitem(last=False)
+
+def _assignment_hash(assignments: List[AssignmentModel]) -> str:
+    """Stable content hash of a solution's assignments"""
+    h = hashlib.blake2b(digest_size=8)
+    for a in assignments:
+        h.update(f"{a.staffId}|{a.wardId}|{a.date}|{a.slot}|{a.shiftTypeId}\n".encode())
+    return h.hexdigest()
 
 @app.get("/healthz")
 async def health_check():
@@ -66,53 +158,63 @@ async def health_check():
 async def get_debug_last():
     """Get last request/response and debug log"""
     return {
-        "request": LAST["request"],
-        "response": LAST["response"], 
-        "log": LAST["log"][-100:]  # Last 100 log entries
+        "request": json.loads(LAST["request"]) if LAST["request"] is not None else None,
+        "response": LAST["response"].model_dump(mode="json") if LAST["response"] is not None else None,
+        "log": list(LAST["log"])  # Last 100 log entries
     }
 
 @app.post("/solve_full")
-async def solve_full(request_data: dict):
+async def solve_full(http_request: Request):
     """Solve full rota problem"""
     try:
-        # Parse and validate request
-        request = SolverRequestModel(**request_data)
+        # Parse and validate request straight from the raw body
+        body = await http_request.body()
+        request = SolverRequestModel.model_validate_json(body)
         
-        # Save request for debugging
-        LAST["request"] = request_data
+        # Save request for debugging (decoded lazily by /_debug/last)
+        LAST["request"] = body
         
         # Log request summary
-        debug_log(f"=== SOLVER REQUEST SUMMARY ===")
-        debug_log(f"Staff: {len(request.staff)} members")
-        debug_log(f"ShiftTypes: {len(request.shiftTypes)} types")
-        debug_log(f"Wards: {len(request.wards)} wards")
-        debug_log(f"Demand: {len(request.demand)} items")
-        if len(request.demand) > 0:
-            debug_log(f"First demand requirements type: {type(request.demand[0].requirements)}")
-            debug_log(f"First demand requirements: {request.demand[0].requirements}")
-            debug_log(f"First demand requirements keys: {list(request.demand[0].requirements.keys())}")
-            debug_log(f"First demand requirements values: {list(request.demand[0].requirements.values())}")
-        else:
-            debug_log("No demand items")
-        debug_log(f"=================================")
-        
-        # Solve
-        solver = RotaSolverCore()
-        assignments, metrics, diagnostics = solver.solve(request)
+        if logger.isEnabledFor(logging.DEBUG):
+            debug_log(f"=== SOLVER REQUEST SUMMARY ===")
+            debug_log(f"Staff: {len(request.staff)} members")
+            debug_log(f"ShiftTypes: {len(request.shiftTypes)} types")
+            debug_log(f"Wards: {len(request.wards)} wards")
+            debug_log(f"Demand: {len(request.demand)} items")
+            if len(request.demand) > 0:
+                debug_log(f"First demand requirements type: {type(request.demand[0].requirements)}")
+                debug_log(f"First demand requirements: {request.demand[0].requirements}")
+                debug_log(f"First demand requirements keys: {list(request.demand[0].requirements.keys())}")
+                debug_log(f"First demand requirements values: {list(request.demand[0].requirements.values())}")
+            else:
+                debug_log("No demand items")
+            debug_log(f"=================================")
+        
+        # Solve on a worker thread so the event loop stays responsive
+        async with _solver_lock:
+            assignments, metrics, diagnostics = await asyncio.get_running_loop().run_in_executor(
+                None, _run_solve, request
+            )
         
         # Create response
         response = SolverResponseModel(
-            solutionId=f"sol_{hash(str(assignments)) % 100000000:08x}",
+            solutionId=f"sol_{_assignment_hash(assignments)}",
             assignments=assignments,
             metrics=metrics,
             diagnostics=diagnostics
         )
         
-        # Save response for debugging
-        LAST["response"] = response.dict()
+        # Keep the solution for /explain
+        _store_solution(response.solutionId, request, assignments)
+        
+        # Save response for debugging (serialized lazily by /_debug/last)
+        LAST["response"] = response
         
         return response
         
+    except HTTPException:
+        # Client errors raised while reading the body (e.g. bad gzip) pass through
+        raise
     except ValidationError as e:
         debug_log(f"Validation error: {e}")
         raise HTTPException(status_code=422, detail=str(e))
@@ -121,47 +223,57 @@ async def solve_full(request_data: dict):
         raise HTTPException(status_code=500, detail=f"Solver error: {e}")
 
 @app.post("/solve_repair")
-async def solve_repair(request_data: dict):
+async def solve_repair(http_request: Request):
     """Solve repair problem"""
     try:
-        # Parse and validate request
-        request = SolverRequestModel(**request_data)
+        # Parse and validate request straight from the raw body
+        body = await http_request.body()
+        request = SolverRequestModel.model_validate_json(body)
         
-        # Save request for debugging
-        LAST["request"] = request_data
+        # Save request for debugging (decoded lazily by /_debug/last)
+        LAST["request"] = body
         
         # Log request summary
-        debug_log(f"=== SOLVER REPAIR REQUEST SUMMARY ===")
-        debug_log(f"Staff: {len(request.staff)} members")
-        debug_log(f"ShiftTypes: {len(request.shiftTypes)} types")
-        debug_log(f"Wards: {len(request.wards)} wards")
-        debug_log(f"Demand: {len(request.demand)} items")
-        if len(request.demand) > 0:
-            debug_log(f"First demand requirements type: {type(request.demand[0].requirements)}")
-            debug_log(f"First demand requirements: {request.demand[0].requirements}")
-            debug_log(f"First demand requirements keys: {list(request.demand[0].requirements.keys())}")
-            debug_log(f"First demand requirements values: {list(request.demand[0].requirements.values())}")
-        else:
-            debug_log("No demand items")
-        debug_log(f"======================================")
+        if logger.isEnabledFor(logging.DEBUG):
+            debug_log(f"=== SOLVER REPAIR REQUEST SUMMARY ===")
+            debug_log(f"Staff: {len(request.staff)} members")
+            debug_log(f"ShiftTypes: {len(request.shiftTypes)} types")
+            debug_log(f"Wards: {len(request.wards)} wards")
+            debug_log(f"Demand: {len(request.demand)} items")
+            if len(request.demand) > 0:
+                debug_log(f"First demand requirements type: {type(request.demand[0].requirements)}")
+                debug_log(f"First demand requirements: {request.demand[0].requirements}")
+                debug_log(f"First demand requirements keys: {list(request.demand[0].requirements.keys())}")
+                debug_log(f"First demand requirements values: {list(request.demand[0].requirements.values())}")
+            else:
+                debug_log("No demand items")
+            debug_log(f"======================================")
         
         # Solve repair (same as full for now)
-        solver = RotaSolverCore()
-        assignments, metrics, diagnostics = solver.solve(request)
+        async with _solver_lock:
+            assignments, metrics, diagnostics = await asyncio.get_running_loop().run_in_executor(
+                None, _run_solve, request
+            )
         
         # Create response
         response = SolverResponseModel(
-            solutionId=f"repair_{hash(str(assignments)) % 100000000:08x}",
+            solutionId=f"repair_{_assignment_hash(assignments)}",
             assignments=assignments,
             metrics=metrics,
             diagnostics=diagnostics
         )
         
-        # Save response for debugging
-        LAST["response"] = response.dict()
+        # Keep the solution for /explain
+        _store_solution(response.solutionId, request, assignments)
+        
+        # Save response for debugging (serialized lazily by /_debug/last)
+        LAST["response"] = response
         
         return response
         
+    except HTTPException:
+        # Client errors raised while reading the body (e.g. bad gzip) pass through
+        raise
     except ValidationError as e:
         debug_log(f"Validation error: {e}")
         raise HTTPException(status_code=422, detail=str(e))
@@ -192,6 +304,7 @@ async def explain_assignment(
                 detail="Solution not found"
             )
         
+        solutions.move_to_end(scheduleId)
         solution = solutions[scheduleId]
         assignments = solution["assignments"]
         request = solution["request"]
@@ -229,5 +342,13 @@ async def explain_assignment(
 
 if __name__ == "__main__":
     import uvicorn
+    
+    parser = argparse.ArgumentParser(description="MediRota solver service")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile each solve to solve_profile.pstats (inspect with pstats or snakeviz)")
+    args = parser.parse_args()
+    if args.profile:
+        PROFILE_PATH = "solve_profile.pstats"
+    
     uvicorn.run(app, host="0.0.0.0", port=8090)
 
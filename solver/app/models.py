@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field, validator
-from typing import List, Dict, Optional, Any, Union
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import List, Dict, Optional, Any, Union, FrozenSet
 from datetime import datetime
+from functools import cached_property
 from enum import Enum
 
 class StaffRole(str, Enum):
@@ -22,6 +23,8 @@ class WardModel(BaseModel):
     name: str
 
 class ShiftTypeModel(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: str
     code: str
     start: str
@@ -30,6 +33,9 @@ class ShiftTypeModel(BaseModel):
     durationMinutes: int
 
 class StaffModel(BaseModel):
+    # Frozen so the cached sets below cannot drift from their fields
+    model_config = ConfigDict(frozen=True)
+
     id: str
     fullName: str
     job: str
@@ -37,13 +43,26 @@ class StaffModel(BaseModel):
     skills: List[str]
     eligibleWards: List[str]
 
+    @cached_property
+    def skill_set(self) -> FrozenSet[str]:
+        """Skills as a frozenset for O(1) membership, computed once per staff member"""
+        return frozenset(self.skills)
+
+    @cached_property
+    def eligible_ward_set(self) -> FrozenSet[str]:
+        """Eligible ward ids as a frozenset, computed once per staff member"""
+        return frozenset(self.eligibleWards)
+
 class DemandModel(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     wardId: str
     date: str
     slot: str
     requirements: Dict[str, int]
     
-    @validator('requirements', pre=True)
+    @field_validator('requirements', mode='before')
+    @classmethod
     def validate_requirements(cls, v):
         """Validate and coerce requirements to dict of {skill: int}"""
         if isinstance(v, dict):
@@ -90,6 +109,8 @@ class ObjectiveModel(str, Enum):
     MIN_TOTAL_ASSIGNMENTS = "min_total_assignments"
 
 class SolverRequestModel(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     horizon: HorizonModel
     wards: List[WardModel]
     shiftTypes: List[ShiftTypeModel]
@@ -102,10 +123,17 @@ class SolverRequestModel(BaseModel):
     timeBudgetMs: int = Field(default=180000, ge=10000, le=600000)
     hints: List[HintModel] = []
 
+    @cached_property
+    def night_shift_codes(self) -> FrozenSet[str]:
+        """Codes of the night shift types, computed once per request"""
+        return frozenset(st.code for st in self.shiftTypes if st.isNight)
+
 class RepairRequestModel(SolverRequestModel):
     events: List[RepairEventModel]
 
 class AssignmentModel(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     staffId: str
     wardId: str
     date: str
@@ -123,6 +151,8 @@ class UnfilledDemandModel(BaseModel):
 class MetricsModel(BaseModel):
     hardViolations: int
     solveMs: int
+    buildMs: int = 0   # Python-side model construction
+    searchMs: int = 0  # CP-SAT search
     fairnessNightStd: float
     preferenceSatisfaction: float
 
@@ -134,6 +164,8 @@ class DiagnosticsModel(BaseModel):
     summary: Optional[Dict] = None
 
 class SolverResponseModel(BaseModel):
+    model_config = ConfigDict(ser_json_bytes="utf8")
+
     solutionId: str
     assignments: List[AssignmentModel]
     metrics: MetricsModel
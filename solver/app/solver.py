@@ -1,23 +1,34 @@
+import hashlib
+import logging
 import time
 from typing import List, Dict, Tuple, Optional, Set
-from datetime import datetime, timedelta
 from ortools.sat.python import cp_model
-import math
+import numpy as np
 
 from .models import (
     SolverRequestModel, RepairRequestModel, AssignmentModel, 
     MetricsModel, DiagnosticsModel, SolverResponseModel
 )
+from . import solver_kernels
+
+logger = logging.getLogger(__name__)
 
 class RotaSolver:
-    def __init__(self):
+    # Objective weight of each unmet staff preference
+    PREFERENCE_WEIGHT = 5
+    
+    def __init__(self, num_workers: int = 8, random_seed: int = 1, debug: bool = False):
+        self.num_workers = num_workers
+        self.random_seed = random_seed
+        self.debug = debug
         self.model = None
         self.solver = None
-        self.variables = {}
-        self.staff_map = {}
-        self.demand_map = {}
-        self.shift_map = {}
-        self.skill_map = {}
+        self.X = None
+        self.night_variance = None
+        self.pref_penalties = []
+        self.index = None
+        self.build_ms = 0
+        self.search_ms = 0
         
     def solve(self, request: SolverRequestModel, time_budget_ms: int = 300000) -> SolverResponseModel:
         """Solve the rota problem"""
@@ -27,37 +38,45 @@ class RotaSolver:
         self.model = cp_model.CpModel()
         self.solver = cp_model.CpSolver()
         self.solver.parameters.max_time_in_seconds = time_budget_ms / 1000
-        
-        # Build variables and constraints
+        # Run the portfolio of search strategies in parallel, reproducibly
+        self.solver.parameters.num_search_workers = self.num_workers
+        self.solver.parameters.random_seed = self.random_seed
+        self.solver.parameters.relative_gap_limit = 0.01
+        self.solver.parameters.log_search_progress = self.debug
+        
+        # Build variables and constraints, timed apart from the CP-SAT search
+        build_start = time.perf_counter_ns()
         self._build_model(request)
+        self.build_ms = (time.perf_counter_ns() - build_start) // 1_000_000
         
         # Solve
+        search_start = time.perf_counter_ns()
         status = self.solver.Solve(self.model)
+        self.search_ms = (time.perf_counter_ns() - search_start) // 1_000_000
         solve_time_ms = int((time.time() - start_time) * 1000)
+        timing_notes = [f"Model build {self.build_ms}ms, search {self.search_ms}ms"]
         
         # Debug logging
-        print(f"DEBUG: Solver status = {status}")
-        print(f"DEBUG: Number of variables = {len(self.variables)}")
-        print(f"DEBUG: Variables created: {list(self.variables.keys())[:5]}...")
+        if self.debug:
+            logger.debug(self.solver.ResponseStats())
         
         # Process results
         if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
             assignments = self._extract_assignments(request)
-            print(f"DEBUG: Extracted {len(assignments)} assignments")
             metrics = self._calculate_metrics(assignments, request, solve_time_ms)
             diagnostics = DiagnosticsModel(
-                status="optimal" if status == cp_model.OPTIMAL else "feasible",
-                message="Solution found"
+                notes=[f"Solution found ({self.solver.StatusName(status).lower()})"] + timing_notes
             )
         else:
             assignments = []
             metrics = self._create_empty_metrics(solve_time_ms)
             diagnostics = DiagnosticsModel(
-                status="infeasible" if status == cp_model.INFEASIBLE else "timeout",
-                message="No solution found"
+                infeasible=status == cp_model.INFEASIBLE,
+                notes=[f"No solution found ({self.solver.StatusName(status).lower()})"] + timing_notes
             )
         
         return SolverResponseModel(
+            solutionId=f"sol_{self._assignment_hash(assignments)}",
             assignments=assignments,
             metrics=metrics,
             diagnostics=diagnostics
@@ -87,289 +106,124 @@ class RotaSolver:
         
     def _create_mappings(self, request: SolverRequestModel):
         """Create efficient lookup mappings"""
-        # Staff mapping
-        for i, staff in enumerate(request.staff):
-            self.staff_map[staff.id] = i
-            
-        # Demand mapping by date and slot
-        for demand in request.demands:
-            key = (demand.date, demand.slot)
-            if key not in self.demand_map:
-                self.demand_map[key] = []
-            self.demand_map[key].append(demand)
-            
-        # Shift type mapping
-        for i, shift in enumerate(request.shiftTypes):
-            self.shift_map[shift.id] = i
-            
-        # Skill mapping
-        all_skills = set()
-        for staff in request.staff:
-            all_skills.update(staff.skills)
-        for i, skill in enumerate(all_skills):
-            self.skill_map[skill] = i
+        self.index = solver_kernels.create_mappings(request)
             
     def _create_variables(self, request: SolverRequestModel):
         """Create decision variables"""
-        # x[staff_idx][date][slot] = 1 if staff is assigned to date/slot
-        for staff_idx, staff in enumerate(request.staff):
-            for demand in request.demands:
-                var_name = f"x_{staff_idx}_{demand.date}_{demand.slot}"
-                self.variables[var_name] = self.model.NewBoolVar(var_name)
+        self.X = solver_kernels.create_variables(self.model, self.index, len(request.staff), self.debug)
+    
+    def _x_vars(self) -> list:
+        """All assignment variables as a flat list"""
+        return solver_kernels.x_vars(self.X)
                 
     def _add_coverage_constraints(self, request: SolverRequestModel):
         """Add coverage constraints to meet demand"""
-        for (date, slot), demands in self.demand_map.items():
-            for demand in demands:
-                for skill, required_count in demand.requiredBySkill.items():
-                    # Find staff with this skill
-                    skilled_staff = []
-                    for staff_idx, staff in enumerate(request.staff):
-                        if skill in staff.skills:
-                            var_name = f"x_{staff_idx}_{date}_{slot}"
-                            if var_name in self.variables:
-                                skilled_staff.append(self.variables[var_name])
-                    
-                    # Ensure enough staff with this skill are assigned
-                    if skilled_staff:
-                        self.model.Add(sum(skilled_staff) >= required_count)
-                        
-        # Add constraint to ensure at least some assignments are made
-        all_assignments = []
-        for var_name, var in self.variables.items():
-            if var_name.startswith('x_'):
-                all_assignments.append(var)
-        
-        if all_assignments:
-            # Require at least one assignment per demand
-            total_required = sum(
-                sum(demand.requiredBySkill.values()) 
-                for demands in self.demand_map.values() 
-                for demand in demands
-            )
-            self.model.Add(sum(all_assignments) >= total_required)
+        solver_kernels.add_coverage_constraints(self.model, self.index, self.X)
                         
     def _add_staff_constraints(self, request: SolverRequestModel):
         """Add staff-specific constraints"""
-        for staff_idx, staff in enumerate(request.staff):
-            # One shift per day constraint
-            for date in set(demand.date for demand in request.demands):
-                day_shifts = []
-                for demand in request.demands:
-                    if demand.date == date:
-                        var_name = f"x_{staff_idx}_{date}_{demand.slot}"
-                        if var_name in self.variables:
-                            day_shifts.append(self.variables[var_name])
-                
-                if day_shifts:
-                    self.model.Add(sum(day_shifts) <= 1)
-                    
-            # Contract hours constraint (simplified - max shifts per week)
-            max_shifts_per_week = int(staff.contractHoursPerWeek / 8)  # Assume 8-hour shifts
-            for week_start in self._get_week_starts(request):
-                week_shifts = []
-                for demand in request.demands:
-                    if self._is_in_week(demand.date, week_start):
-                        var_name = f"x_{staff_idx}_{demand.date}_{demand.slot}"
-                        if var_name in self.variables:
-                            week_shifts.append(self.variables[var_name])
-                
-                if week_shifts:
-                    self.model.Add(sum(week_shifts) <= max_shifts_per_week)
+        solver_kernels.add_staff_constraints(self.model, request, self.index, self.X)
                     
     def _add_fairness_constraints(self, request: SolverRequestModel):
         """Add fairness constraints"""
-        # Count night shifts per staff
-        night_shift_counts = []
-        for staff_idx, staff in enumerate(request.staff):
-            night_shifts = []
-            for demand in request.demands:
-                # Find if this is a night shift
-                for shift in request.shiftTypes:
-                    if shift.isNight and demand.slot == shift.code:
-                        var_name = f"x_{staff_idx}_{demand.date}_{demand.slot}"
-                        if var_name in self.variables:
-                            night_shifts.append(self.variables[var_name])
-                        break
-            
-            if night_shifts:
-                count_var = self.model.NewIntVar(0, len(night_shifts), f"night_count_{staff_idx}")
-                self.model.Add(count_var == sum(night_shifts))
-                night_shift_counts.append(count_var)
-                
-        # Minimize variance in night shift distribution
-        if night_shift_counts:
-            min_nights = self.model.NewIntVar(0, max(len(request.demands), 1), "min_nights")
-            max_nights = self.model.NewIntVar(0, max(len(request.demands), 1), "max_nights")
-            
-            for count in night_shift_counts:
-                self.model.Add(count >= min_nights)
-                self.model.Add(count <= max_nights)
-                
-            # Store for objective
-            self.variables['night_variance'] = max_nights - min_nights
+        self.night_variance = solver_kernels.add_fairness_constraints(
+            self.model, request, self.index, self.X, self.debug
+        )
             
     def _add_preference_constraints(self, request: SolverRequestModel):
-        """Add preference constraints"""
+        """Add preferences as soft penalties for the objective"""
+        self.pref_penalties = []
         for preference in request.preferences:
-            staff_idx = self.staff_map.get(preference.staffId)
-            if staff_idx is not None:
-                for demand in request.demands:
-                    if demand.date == preference.date:
-                        var_name = f"x_{staff_idx}_{demand.date}_{demand.slot}"
-                        if var_name in self.variables:
-                            if preference.preferOff:
-                                # Soft constraint - prefer not to assign
-                                self.variables[var_name].SetCoefficient(1)
-                            elif preference.preferOn:
-                                # Soft constraint - prefer to assign
-                                self.variables[var_name].SetCoefficient(-1)
+            staff_idx = self.index.staff_map.get(preference.staffId)
+            d_idx = self.index.date_index.get(preference.date)
+            if staff_idx is not None and d_idx is not None:
+                for cell in self.index.cells_by_date[d_idx]:
+                    var = self.X[staff_idx][cell]
+                    if preference.preferOff:
+                        # Penalize working a shift the staff member wanted off
+                        self.pref_penalties.append((var, self.PREFERENCE_WEIGHT))
+                    elif preference.preferOn:
+                        # Reward working the wanted day (at most one shift per day)
+                        self.pref_penalties.append((var, -self.PREFERENCE_WEIGHT))
                                 
     def _add_lock_constraints(self, request: SolverRequestModel):
         """Add lock constraints for fixed assignments"""
         for lock in request.locks:
-            staff_idx = self.staff_map.get(lock.staffId)
-            if staff_idx is not None:
-                var_name = f"x_{staff_idx}_{lock.date}_{lock.slot}"
-                if var_name in self.variables:
-                    self.model.Add(self.variables[var_name] == 1)
+            staff_idx = self.index.staff_map.get(lock.staffId)
+            d_idx = self.index.date_index.get(lock.date)
+            s_idx = self.index.slot_index.get(lock.slot)
+            if staff_idx is not None and d_idx is not None and s_idx is not None:
+                cell = self.index.cell_index.get((d_idx, s_idx))
+                if cell is not None:
+                    self.model.Add(self.X[staff_idx][cell] == 1)
                     
     def _set_objective(self, request: SolverRequestModel):
         """Set the objective function"""
         # Minimize total assignments (efficiency)
-        total_assignments = []
-        for var_name, var in self.variables.items():
-            if var_name.startswith('x_'):
-                total_assignments.append(var)
+        total_assignments = self._x_vars()
                 
         # Add fairness penalty
-        fairness_penalty = self.variables.get('night_variance', 0)
+        fairness_penalty = self.night_variance if self.night_variance is not None else 0
         
         # Set objective
-        self.model.Minimize(sum(total_assignments) + 10 * fairness_penalty)
+        self.model.Minimize(cp_model.LinearExpr.WeightedSum(
+            total_assignments + [fairness_penalty] + [term for term, _ in self.pref_penalties],
+            [1] * len(total_assignments) + [10] + [weight for _, weight in self.pref_penalties]
+        ))
         
     def _extract_assignments(self, request: SolverRequestModel) -> List[AssignmentModel]:
         """Extract assignments from solver solution"""
-        assignments = []
+        return solver_kernels.extract_assignments(self.solver, request, self.index)
         
-        for staff_idx, staff in enumerate(request.staff):
-            for demand in request.demands:
-                var_name = f"x_{staff_idx}_{demand.date}_{demand.slot}"
-                if var_name in self.variables:
-                    if self.solver.Value(self.variables[var_name]) == 1:
-                        # Find the shift type for this slot
-                        shift_type_id = None
-                        for shift in request.shiftTypes:
-                            if shift.code == demand.slot:
-                                shift_type_id = shift.id
-                                break
-                                
-                        if shift_type_id:
-                            assignments.append(AssignmentModel(
-                                staffId=staff.id,
-                                date=demand.date,
-                                slot=demand.slot,
-                                shiftTypeId=shift_type_id
-                            ))
-                            
-        return assignments
+    def _assignment_hash(self, assignments: List[AssignmentModel]) -> str:
+        """Stable content hash of a solution's assignments"""
+        h = hashlib.blake2b(digest_size=8)
+        for a in assignments:
+            h.update(f"{a.staffId}|{a.wardId}|{a.date}|{a.slot}|{a.shiftTypeId}\n".encode())
+        return h.hexdigest()
         
     def _calculate_metrics(self, assignments: List[AssignmentModel], request: SolverRequestModel, solve_time_ms: int) -> MetricsModel:
         """Calculate solution metrics"""
-        # Count unfilled demand
-        unfilled_demand = 0
-        for (date, slot), demands in self.demand_map.items():
-            for demand in demands:
-                for skill, required_count in demand.requiredBySkill.items():
-                    assigned_count = 0
-                    for assignment in assignments:
-                        if assignment.date == date and assignment.slot == slot:
-                            # Check if assigned staff has the required skill
-                            for staff in request.staff:
-                                if staff.id == assignment.staffId and skill in staff.skills:
-                                    assigned_count += 1
-                                    break
-                    unfilled_demand += max(0, required_count - assigned_count)
-                    
-        # Calculate fairness score (inverse of night shift variance)
-        night_shifts_per_staff = {}
-        for assignment in assignments:
-            # Check if this is a night shift
-            for shift in request.shiftTypes:
-                if shift.id == assignment.shiftTypeId and shift.isNight:
-                    night_shifts_per_staff[assignment.staffId] = night_shifts_per_staff.get(assignment.staffId, 0) + 1
-                    break
-                    
-        if night_shifts_per_staff:
-            night_counts = list(night_shifts_per_staff.values())
-            fairness_std = self._calculate_std(night_counts)
-            fairness_score = 1.0 / (1.0 + fairness_std)  # Higher is better
-        else:
-            fairness_score = 1.0
+        # Coverage is a hard constraint here, so a returned solution never
+        # leaves demand unfilled
+        
+        # Night shift spread (population std of night shifts per staff member)
+        staff_ids = np.array([assignment.staffId for assignment in assignments], dtype=object)
+        shift_type_ids = np.array([assignment.shiftTypeId for assignment in assignments], dtype=object)
+        night_mask = np.isin(shift_type_ids, list(self.index.night_shift_ids))
+        _, night_counts = np.unique(staff_ids[night_mask].astype(str), return_counts=True)
+        fairness_std = float(night_counts.std()) if len(night_counts) > 1 else 0.0
             
-        # Calculate preference satisfaction
+        # Calculate preference satisfaction against the worked (staff, date) pairs
+        assigned_keys = set(zip(staff_ids.tolist(), [assignment.date for assignment in assignments]))
         satisfied_preferences = 0
         total_preferences = len(request.preferences)
         
         for preference in request.preferences:
-            for assignment in assignments:
-                if (assignment.staffId == preference.staffId and 
-                    assignment.date == preference.date):
-                    if preference.preferOn:
-                        satisfied_preferences += 1
-                    elif preference.preferOff:
-                        satisfied_preferences -= 1
-                    break
+            if (preference.staffId, preference.date) in assigned_keys:
+                if preference.preferOn:
+                    satisfied_preferences += 1
+                elif preference.preferOff:
+                    satisfied_preferences -= 1
                     
         preference_satisfaction = max(0, satisfied_preferences / max(1, total_preferences))
         
         return MetricsModel(
-            objective=float(self.solver.ObjectiveValue()),
-            unfilledDemand=unfilled_demand,
             hardViolations=0,  # Would need to track constraint violations
-            fairnessScore=fairness_score,
-            preferenceScore=preference_satisfaction,
-            solveTimeMs=solve_time_ms,
-            fairnessNightStd=self._calculate_std(list(night_shifts_per_staff.values())) if night_shifts_per_staff else 0.0,
+            solveMs=solve_time_ms,
+            buildMs=self.build_ms,
+            searchMs=self.search_ms,
+            fairnessNightStd=fairness_std,
             preferenceSatisfaction=preference_satisfaction
         )
         
     def _create_empty_metrics(self, solve_time_ms: int) -> MetricsModel:
         """Create empty metrics for failed solves"""
         return MetricsModel(
-            objective=float('inf'),
-            unfilledDemand=0,
             hardViolations=0,
-            fairnessScore=0.0,
-            preferenceScore=0.0,
-            solveTimeMs=solve_time_ms,
+            solveMs=solve_time_ms,
+            buildMs=self.build_ms,
+            searchMs=self.search_ms,
             fairnessNightStd=0.0,
             preferenceSatisfaction=0.0
         )
-        
-    def _get_week_starts(self, request: SolverRequestModel) -> List[str]:
-        """Get list of week start dates"""
-        dates = sorted(set(demand.date for demand in request.demands))
-        week_starts = []
-        for date in dates:
-            dt = datetime.fromisoformat(date.replace('Z', '+00:00'))
-            week_start = dt - timedelta(days=dt.weekday())
-            week_start_str = week_start.strftime('%Y-%m-%d')
-            if week_start_str not in week_starts:
-                week_starts.append(week_start_str)
-        return week_starts
-        
-    def _is_in_week(self, date_str: str, week_start: str) -> bool:
-        """Check if date is in the specified week"""
-        date_dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-        week_start_dt = datetime.fromisoformat(week_start)
-        week_end_dt = week_start_dt + timedelta(days=6)
-        return week_start_dt <= date_dt <= week_end_dt
-        
-    def _calculate_std(self, values: List[float]) -> float:
-        """Calculate standard deviation"""
-        if not values:
-            return 0.0
-        mean = sum(values) / len(values)
-        variance = sum((x - mean) ** 2 for x in values) / len(values)
-        return math.sqrt(variance)
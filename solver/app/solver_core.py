@@ -3,17 +3,21 @@ Core CP-SAT solver for NHS rota optimization
 Implements all hard and soft constraints with proper validation
 """
 
+import os
 import time
 import uuid
 import logging
+from collections import defaultdict
 from typing import List, Dict, Tuple, Optional, Set, NamedTuple, Union
-from datetime import datetime, date, timedelta
+from datetime import date
+from google.protobuf import text_format
+from ortools.graph.python import max_flow
 from ortools.sat.python import cp_model
 import numpy as np
 
 from .models import (
     SolverRequestModel, AssignmentModel, MetricsModel, DiagnosticsModel,
-    UnfilledDemandModel, RepairRequestModel
+    UnfilledDemandModel, RepairRequestModel, DemandModel
 )
 
 # Configure logging
@@ -28,6 +32,35 @@ except ImportError:
     def debug_log(message: str):
         logger.info(f"[DEBUG] {message}")
 
+# Numba is optional: without it the kernels below run as plain Python
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+@njit(cache=True)
+def _week_minutes_kernel(staff_idx, date_idx, slot_idx, date_week, shift_dur, n_staff, n_weeks):
+    """Assigned minutes and shift count per [staff, week] from per-assignment index arrays"""
+    week_assigned = np.zeros((n_staff, n_weeks), dtype=np.int64)
+    week_shifts = np.zeros((n_staff, n_weeks), dtype=np.int64)
+    for i in range(staff_idx.shape[0]):
+        week = date_week[date_idx[i]]
+        week_assigned[staff_idx[i], week] += shift_dur[slot_idx[i]]
+        week_shifts[staff_idx[i], week] += 1
+    return week_assigned, week_shifts
+
+def _hhmm_to_minutes(hhmm: str) -> int:
+    """Minutes from midnight of an "HH:MM" time"""
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def _next_pow2(n: int) -> int:
+    """Smallest power of two >= n (n >= 1)"""
+    return 1 << (n - 1).bit_length()
+
 class ModelIndices(NamedTuple):
     """Indices for efficient lookups"""
     staff_idx: Dict[str, int]
@@ -39,45 +72,74 @@ class ModelIndices(NamedTuple):
     week_bins: Dict[str, List[str]]  # week_key -> list of dates
     week_idx: Dict[str, str]  # date -> week_key
     shift_durations: Dict[str, int]  # shift_type_id -> duration_minutes
-    forbidden_adjacency: Dict[str, Dict[str, bool]]  # shift_type_id -> shift_type_id -> forbidden
+    shift_minutes: Dict[str, Tuple[int, int]]  # shift_type_id -> (start, end) minutes from midnight
+    staff_by_skill_ward: Dict[Tuple[str, str], List[int]]  # (skill, ward_id) -> staff positions
+    dates: Tuple[str, ...]  # horizon dates, positions match date_idx
+    slots: Tuple[str, ...]  # shift codes, positions match slot_idx
+    ward_ids: Tuple[str, ...]  # positions match ward_idx
+    date_week: np.ndarray  # date position -> position of its week in week_bins
+    week_caps: np.ndarray  # [staff, week] contract minutes prorated to the horizon days in the week
+    staff_classes: Tuple[Tuple[int, ...], ...]  # interchangeable staff positions, classes of two or more
+
+class ModelVariables(NamedTuple):
+    """Dense CP-SAT variable arrays addressed by ModelIndices positions"""
+    x: np.ndarray       # [staff, date, ward, slot] -> BoolVar
+    x_mask: np.ndarray  # True where x holds a variable
+    y: np.ndarray       # [staff, date, ward, slot, skill] -> BoolVar
+    y_mask: np.ndarray
+    u: np.ndarray       # [date, ward, slot, skill] -> IntVar (unmet demand)
+    u_mask: np.ndarray
+    x_index: np.ndarray  # CP-SAT variable index of each x[x_mask], in mask order
+    y_index: np.ndarray  # CP-SAT variable index of each y[y_mask], in mask order
 
 class RotaSolverCore:
     """Core CP-SAT solver for rota optimization"""
     
+    # Models with at most this many assignment variables count as small
+    SMALL_MODEL_VARS = 500
+    
     def __init__(self):
-        # Objective weights - A dominates to fill demand first
-        self.A = 100_000    # unmet demand (reduced weight)
-        self.B = 100        # fairness penalty (reduced from 10)
-        self.C = 1          # preferences (if any)
-        self.D = 1_000_000  # staff utilization penalty (dominant weight)
+        # Optional CP-SAT parameter overrides in SatParameters text format,
+        # e.g. the best set found by an offline cpsat-autotune run:
+        #   num_workers: 16
+        #   linearization_level: 1
+        self.parameter_overrides = ""
+        params_path = os.environ.get("DMR_SOLVER_PARAMS")
+        if params_path:
+            with open(params_path) as f:
+                self.parameter_overrides = f.read()
+            logger.info(f"Loaded CP-SAT parameter overrides from {params_path}")
         
     def solve(self, request: SolverRequestModel) -> Tuple[List[AssignmentModel], MetricsModel, DiagnosticsModel]:
         """Main solve method"""
         start_time = time.time()
         
         # Debug logging
-        debug_log(f"SOLVE START: |staff|={len(request.staff)}, |shiftTypes|={len(request.shiftTypes)}, |wards|={len(request.wards)}, #dates={len(self._get_dates(request.horizon))}, #demand={len(request.demand)}")
+        debug_log(f"SOLVE START: |staff|={len(request.staff)}, |shiftTypes|={len(request.shiftTypes)}, |wards|={len(request.wards)}, #dates={(date.fromisoformat(request.horizon.end) - date.fromisoformat(request.horizon.start)).days + 1}, #demand={len(request.demand)}")
         
-        # Build model
-        model, indices, x, y, u = self._build_model(request)
+        # Build model (timed separately from the search so buildMs vs searchMs
+        # shows whether Python-side construction or CP-SAT dominates)
+        build_start = time.perf_counter_ns()
+        model, indices, variables = self._build_model(request)
+        build_ms = (time.perf_counter_ns() - build_start) // 1_000_000
         
         # Solve
         solver = cp_model.CpSolver()
         solver.parameters.max_time_in_seconds = request.timeBudgetMs / 1000
-        solver.parameters.num_search_workers = 8  # Use multiple threads
-        solver.parameters.log_search_progress = True  # Log progress
-        solver.parameters.cp_model_presolve = True  # Enable presolve
-        solver.parameters.linearization_level = 2  # More aggressive linearization
-        solver.parameters.interleave_search = True  # Interleave search strategies
+        # CP-SAT's search log goes to stdout; only worth its cost when debugging
+        solver.parameters.log_search_progress = logger.isEnabledFor(logging.DEBUG)
+        self._tune_parameters(solver, variables)
         
-        logger.info(f"Starting solve with {len(x)} assignment vars, {len(y)} skill vars, {len(u)} slack vars and {request.timeBudgetMs}ms time budget")
+        logger.info(f"Starting solve with {int(variables.x_mask.sum())} assignment vars, {int(variables.y_mask.sum())} skill vars, {int(variables.u_mask.sum())} slack vars and {request.timeBudgetMs}ms time budget")
         
         # Add hints if provided
         if request.hints:
             self._add_hints(model, solver, indices, request)
         
         try:
+            search_start = time.perf_counter_ns()
             status = solver.Solve(model)
+            search_ms = (time.perf_counter_ns() - search_start) // 1_000_000
             solve_time_ms = int((time.time() - start_time) * 1000)
             logger.info(f"Solve completed with status {status} in {solve_time_ms}ms")
         except Exception as e:
@@ -92,58 +154,72 @@ class RotaSolverCore:
         logger.info(f"Status comparison: status == OPTIMAL: {status == cp_model.OPTIMAL}, status == FEASIBLE: {status == cp_model.FEASIBLE}")
         
         # Debug logging for solve results
-        debug_log(f"SOLVE COMPLETE: status={status}, solveMs={solve_time_ms}")
+        debug_log(f"SOLVE COMPLETE: status={status}, solveMs={solve_time_ms}, buildMs={build_ms}, searchMs={search_ms}")
         
         # Enhanced solve logging
         debug_log(f"SOLVE RESULTS: status={status}, solveMs={solve_time_ms}, status==OPTIMAL={status == cp_model.OPTIMAL}, status==FEASIBLE={status == cp_model.FEASIBLE}")
         
         # Extract assignments regardless of status for debugging
-        assignments = self._extract_assignments(solver, x, indices, request)
+        solution = self._solution_values(solver)
+        assignments = self._extract_assignments(solution, variables, indices, request)
         
         # Debug logging for assignments
         debug_log(f"ASSIGNMENTS EXTRACTED: {len(assignments)} assignments")
         metrics = self._calculate_metrics(assignments, request, solve_time_ms)
+        metrics.buildMs = build_ms
+        metrics.searchMs = search_ms
         
         # Create assignments summary for diagnostics
-        summary = self._create_assignments_summary(assignments, request, solver, y, u)
+        summary = self._create_assignments_summary(assignments, request, solution, variables, indices)
         
         diagnostics = DiagnosticsModel(
             infeasible=False,
-            notes=["Validation temporarily disabled"],
+            notes=["Validation temporarily disabled", f"Model build {build_ms}ms, search {search_ms}ms"],
             summary=summary
         )
         
         return assignments, metrics, diagnostics
     
-    def _create_assignments_summary(self, assignments: List[AssignmentModel], request: SolverRequestModel, solver: cp_model.CpSolver, y: Dict, u: Dict) -> Dict:
+    def _tune_parameters(self, solver: cp_model.CpSolver, variables: ModelVariables):
+        """Pick CP-SAT search parameters for the instance size, then apply any overrides"""
+        params = solver.parameters
+        params.cp_model_presolve = True  # Enable presolve
+        params.interleave_search = True  # Interleave search strategies
+        
+        if int(variables.x_mask.sum()) <= self.SMALL_MODEL_VARS:
+            # Small models are proven optimal in well under a second; skip the
+            # extra LP work and don't fan out across every core
+            params.linearization_level = 0
+            params.num_search_workers = min(os.cpu_count() or 1, 4)
+        else:
+            # Larger models benefit from the full portfolio and LP bounds
+            params.linearization_level = 2
+            params.num_search_workers = max(os.cpu_count() or 1, 8)
+        
+        if self.parameter_overrides:
+            if hasattr(params, "merge_text_format"):
+                # Newer OR-Tools wrap SatParameters rather than exposing the proto
+                params.merge_text_format(self.parameter_overrides)
+            else:
+                text_format.Merge(self.parameter_overrides, params)
+    
+    def _create_assignments_summary(self, assignments: List[AssignmentModel], request: SolverRequestModel, solution: np.ndarray, variables: ModelVariables, indices: ModelIndices) -> Dict:
         """Create comprehensive assignments summary for diagnostics"""
         # Dates histogram
         dates_histogram = {}
         for assignment in assignments:
             dates_histogram[assignment.date] = dates_histogram.get(assignment.date, 0) + 1
         
-        # Build demand lookup
-        demand_req = {}
-        for demand in request.demand:
-            for skill, count in demand.requirements.items():
-                key = (demand.date, demand.wardId, demand.slot, skill)
-                demand_req[key] = count
-        
         # Cell fill statistics with skill-specific analysis
         cell_fill = {}
         total_unmet = 0
         
-        # Calculate assigned by skill per cell
-        assigned_by_skill = {}
-        for (d, w, s, k), _ in demand_req.items():
-            assigned_by_skill[(d, w, s, k)] = 0
-            var_name = f"y_*_{d}_{s}_{w}_{k}"
-            # Sum all staff assignments for this skill in this cell
-            for staff in request.staff:
-                if k in staff.skills:
-                    skill_var_name = f"y_{staff.id}_{d}_{s}_{w}_{k}"
-                    if skill_var_name in y:
-                        assigned_by_skill[(d, w, s, k)] += solver.Value(y[skill_var_name])
+        # Calculate assigned by skill per cell: read every skill variable once
+        # and reduce over the staff axis, giving [date, ward, slot, skill]
+        y_values = np.zeros(variables.y_mask.shape, dtype=np.int8)
+        if variables.y_mask.any() and solution.size:
+            y_values[variables.y_mask] = solution[variables.y_index]
+        assigned_by_skill = y_values.sum(axis=0)
         
         # Calculate cell-level statistics
         for demand in request.demand:
@@ -154,9 +230,10 @@ class RotaSolverCore:
             assigned_cell = 0
             unmet_cell = 0
             
+            cell = self._cell_index(indices, demand.date, demand.wardId, demand.slot)
             for skill, required in demand.requirements.items():
                 required_cell += required
-                assigned = assigned_by_skill.get((demand.date, demand.wardId, demand.slot, skill), 0)
+                assigned = int(assigned_by_skill[cell + (indices.skill_idx[skill],)]) if cell is not None else 0
                 assigned_cell += assigned
                 unmet = max(0, required - assigned)
                 unmet_cell += unmet
@@ -168,61 +245,51 @@ class RotaSolverCore:
                 "unmet": unmet_cell
             }
         
+        # Shift types by slot code (first declared wins) and assignments by staff
+        shift_by_code = {}
+        for st in request.shiftTypes:
+            shift_by_code.setdefault(st.code, st)
+        assignments_by_staff = defaultdict(list)
+        for assignment in assignments:
+            assignments_by_staff[assignment.staffId].append(assignment)
+        
         # Staff minutes and shifts
         staff_minutes = {}
         staff_shifts = {}
         for staff in request.staff:
-            total_minutes = 0
-            shift_count = 0
-            for assignment in assignments:
-                if assignment.staffId == staff.id:
-                    shift_type = next(st for st in request.shiftTypes if st.code == assignment.slot)
-                    total_minutes += shift_type.durationMinutes
-                    shift_count += 1
-            staff_minutes[staff.id] = total_minutes
-            staff_shifts[staff.id] = shift_count
-        
-        # Week caps validation
+            staff_assignments = assignments_by_staff[staff.id]
+            staff_minutes[staff.id] = sum(shift_by_code[a.slot].durationMinutes for a in staff_assignments)
+            staff_shifts[staff.id] = len(staff_assignments)
+        
+        # Week caps validation: assigned minutes per staff and ISO week from
+        # integer index arrays, capped by the contract prorated to the days of
+        # the week inside the horizon
+        week_keys = list(indices.week_bins)
+        shift_dur = np.array([shift_by_code[slot].durationMinutes for slot in indices.slots], dtype=np.int32)
+        week_assigned, week_shifts = _week_minutes_kernel(
+            np.array([indices.staff_idx[a.staffId] for a in assignments], dtype=np.int32),
+            np.array([indices.date_idx[a.date] for a in assignments], dtype=np.int32),
+            np.array([indices.slot_idx[a.slot] for a in assignments], dtype=np.int32),
+            indices.date_week, shift_dur, len(request.staff), len(week_keys)
+        )
+        
         week_caps = {}
-        for staff in request.staff:
-            contract_minutes = int(staff.contractHoursPerWeek * 60)
+        for e, staff in enumerate(request.staff):
             week_caps[staff.id] = {}
-            
-            # Group assignments by week
-            staff_assignments = [a for a in assignments if a.staffId == staff.id]
-            for assignment in staff_assignments:
-                date_obj = date.fromisoformat(assignment.date)
-                week_key = f"{date_obj.isocalendar()[0]}-{date_obj.isocalendar()[1]:02d}"
-                
-                if week_key not in week_caps[staff.id]:
-                    week_caps[staff.id][week_key] = {"cap": 0, "assigned": 0}
-                
-                # Calculate cap for this week
-                week_start = date_obj - timedelta(days=date_obj.weekday())
-                week_end = week_start + timedelta(days=6)
-                horizon_start = date.fromisoformat(request.horizon.start)
-                horizon_end = date.fromisoformat(request.horizon.end)
-                
-                # Count days in this week that are within horizon
-                days_in_week = 0
-                current = max(week_start, horizon_start)
-                while current <= min(week_end, horizon_end):
-                    days_in_week += 1
-                    current += timedelta(days=1)
-                
-                prorated_cap = int(contract_minutes * (days_in_week / 7.0))
-                week_caps[staff.id][week_key]["cap"] = prorated_cap
-                
-                # Add assigned minutes
-                shift_type = next(st for st in request.shiftTypes if st.code == assignment.slot)
-                week_caps[staff.id][week_key]["assigned"] += shift_type.durationMinutes
+            for wk in np.flatnonzero(week_shifts[e]).tolist():
+                week_caps[staff.id][week_keys[wk]] = {
+                    "cap": int(indices.week_caps[e, wk]),
+                    "assigned": int(week_assigned[e, wk])
+                }
         
         # Per-date statistics
+        assigned_by_cell = defaultdict(int)
+        for a in assignments:
+            assigned_by_cell[(a.date, a.slot, a.wardId)] += 1
         per_date = []
-        for demand in request.demand:
-            assigned = sum(1 for a in assignments 
-                         if a.date == demand.date and a.slot == demand.slot and a.wardId == demand.wardId)
-            required = self._total_required(demand.requirements)
+        required_by_demand = self._total_required_all(request.demand)
+        for demand, required in zip(request.demand, required_by_demand.tolist()):
+            assigned = assigned_by_cell.get((demand.date, demand.slot, demand.wardId), 0)
             per_date.append({
                 "date": demand.date,
                 "required": required,
@@ -259,7 +326,7 @@ class RotaSolverCore:
         return {
             "dates_histogram": dates_histogram,
             "cell_fill": cell_fill,
-            "total_required": sum(self._total_required(d.requirements) for d in request.demand),
+            "total_required": int(required_by_demand.sum()),
             "total_assigned": len(assignments),
             "total_unmet": total_unmet,
             "staff_minutes": staff_minutes,
@@ -276,7 +343,7 @@ class RotaSolverCore:
         # This is a simplified implementation - in practice you'd need to track the previous solution
         return self.solve(request)
     
-    def _build_model(self, request: SolverRequestModel) -> Tuple[cp_model.CpModel, ModelIndices, Dict, Dict, Dict]:
+    def _build_model(self, request: SolverRequestModel) -> Tuple[cp_model.CpModel, ModelIndices, ModelVariables]:
         """Build the CP-SAT model with all constraints"""
         model = cp_model.CpModel()
         
@@ -284,362 +351,552 @@ class RotaSolverCore:
         indices = self._create_indices(request)
         
         # 1. Build explicit index sets
-        D = self._get_dates(request.horizon)  # dates
-        WARDS = [ward.id for ward in request.wards]  # wards
-        SLOTS = [st.code for st in request.shiftTypes]  # slots
-        SKILLS = self._collect_skills(request)  # distinct skills from demand
+        D = indices.dates  # dates
+        WARDS = indices.ward_ids  # wards
+        SLOTS = indices.slots  # slots
+        SKILLS = list(indices.skill_idx)  # distinct skills from demand
         E = [staff.id for staff in request.staff]  # staff
+        nE, nD, nW, nS, nK = len(E), len(D), len(WARDS), len(SLOTS), len(SKILLS)
         
         # 2. Build demand lookup and demand cell mask
-        demand_req, has_demand_cell = self._build_demand_lookup(request)
-        
-        # Guardrail: confirm at least one cell has demand
-        if not any(has_demand_cell.values()):
-            logger.warning("No demand cells found - short-circuiting")
-            return model, indices, {}, {}, {}
-        
-        debug_log(f"DEMAND LOOKUP: {len(demand_req)} skill requirements, {sum(has_demand_cell.values())} cells with demand")
-        
-        # 3. Create decision variables
+        demand_req, cell_mask = self._build_demand_lookup(request, indices)
+        u_mask = demand_req > 0
+        
+        # Staff-level masks: skills held and wards staff may work on
+        has_skill = np.zeros((nE, nK), dtype=bool)
+        eligible_ward = np.zeros((nE, nW), dtype=bool)
+        for e, staff in enumerate(request.staff):
+            for skill in staff.skills:
+                if skill in indices.skill_idx:
+                    has_skill[e, indices.skill_idx[skill]] = True
+            eligible_ward[e] = [ward_id in staff.eligible_ward_set for ward_id in WARDS]
+        
+        # 3. Create decision variables, addressed by integer index; masks mark
+        # the cells that hold a variable
         # x[e,d,w,s] ∈ {0,1}: staff e works (date d, ward w, slot s)
-        x = {}
-        for e in E:
-            for d in D:
-                for w in WARDS:
-                    for s in SLOTS:
-                        # Only create variables for cells with demand
-                        if has_demand_cell[(d, w, s)]:
-                            var_name = f"x_{e}_{d}_{s}_{w}"
-                            x[var_name] = model.NewBoolVar(var_name)
-        
+        # Only create variables for cells with demand
+        x_mask = np.broadcast_to(cell_mask, (nE, nD, nW, nS)).copy()
         # y[e,d,w,s,k] ∈ {0,1}: staff e works with skill k (date d, ward w, slot s)
-        y = {}
-        for e in E:
-            for d in D:
-                for w in WARDS:
-                    for s in SLOTS:
-                        for k in SKILLS:
-                            # Only create variables for cells with demand and staff with skill
-                            if has_demand_cell[(d, w, s)]:
-                                staff = next(st for st in request.staff if st.id == e)
-                                if k in staff.skills:
-                                    var_name = f"y_{e}_{d}_{s}_{w}_{k}"
-                                    y[var_name] = model.NewBoolVar(var_name)
-        
+        # Only create variables for cells with demand on wards the staff member
+        # is eligible for, and skills they hold
+        y_mask = (
+            x_mask[..., np.newaxis]
+            & eligible_ward[:, np.newaxis, :, np.newaxis, np.newaxis]
+            & has_skill[:, np.newaxis, np.newaxis, np.newaxis, :]
+        )
         # u[d,w,s,k] ∈ ℕ≥0: unmet demand for skill k in cell (d,w,s)
-        u = {}
-        for d in D:
-            for w in WARDS:
-                for s in SLOTS:
-                    for k in SKILLS:
-                        if (d, w, s, k) in demand_req:
-                            var_name = f"u_{d}_{s}_{w}_{k}"
-                            u[var_name] = model.NewIntVar(0, demand_req[(d, w, s, k)], var_name)
+        variables = ModelVariables(
+            x=np.empty(x_mask.shape, dtype=object), x_mask=x_mask,
+            y=np.empty(y_mask.shape, dtype=object), y_mask=y_mask,
+            u=np.empty(u_mask.shape, dtype=object), u_mask=u_mask,
+            x_index=np.empty(int(x_mask.sum()), dtype=np.int64),
+            y_index=np.empty(int(y_mask.sum()), dtype=np.int64),
+        )
         
-        debug_log(f"VARIABLES: {len(x)} assignment vars, {len(y)} skill vars, {len(u)} slack vars")
+        # Guardrail: confirm at least one cell has demand
+        if not cell_mask.any():
+            logger.warning("No demand cells found - short-circuiting")
+            return model, indices, variables
+        
+        debug_log(f"DEMAND LOOKUP: {int(u_mask.sum())} skill requirements, {int(cell_mask.sum())} cells with demand")
+        
+        # Names only matter when reading CP-SAT logs; left empty they keep the
+        # model proto (copied to every search worker) small
+        named = logger.isEnabledFor(logging.DEBUG)
+        x, y, u = variables.x, variables.y, variables.u
+        for i, (e, d, w, s) in enumerate(np.argwhere(x_mask).tolist()):
+            var_name = f"x_{E[e]}_{D[d]}_{SLOTS[s]}_{WARDS[w]}" if named else ""
+            x[e, d, w, s] = var = model.NewBoolVar(var_name)
+            variables.x_index[i] = var.Index()
+        for i, (e, d, w, s, k) in enumerate(np.argwhere(y_mask).tolist()):
+            var_name = f"y_{E[e]}_{D[d]}_{SLOTS[s]}_{WARDS[w]}_{SKILLS[k]}" if named else ""
+            y[e, d, w, s, k] = var = model.NewBoolVar(var_name)
+            variables.y_index[i] = var.Index()
+        for d, w, s, k in np.argwhere(u_mask).tolist():
+            var_name = f"u_{D[d]}_{SLOTS[s]}_{WARDS[w]}_{SKILLS[k]}" if named else ""
+            u[d, w, s, k] = model.NewIntVar(0, int(demand_req[d, w, s, k]), var_name)
+        
+        debug_log(f"VARIABLES: {int(x_mask.sum())} assignment vars, {int(y_mask.sum())} skill vars, {int(u_mask.sum())} slack vars")
         
         # 4. Feasibility links
-        self._add_feasibility_links(model, x, y, request, has_demand_cell)
+        self._add_feasibility_links(model, variables, indices, request)
+        
+        # Phase 1: flow relaxation bounding how much demand can be covered at all
+        coverable = self._phase1_feasibility(request, indices, variables, demand_req)
+        in_horizon_required = int(demand_req.sum())
+        unmet_lower_bound = in_horizon_required - coverable
+        debug_log(f"PHASE 1: at most {coverable}/{in_horizon_required} skill requirements coverable, unmet >= {unmet_lower_bound}")
+        if unmet_lower_bound > 0:
+            # Valid cut on total slack; lets the search prove the unmet term early
+            model.Add(sum(variables.u[variables.u_mask].tolist()) >= unmet_lower_bound)
         
         # 5. Coverage by skill
-        self._add_coverage_constraints_with_slack(model, y, u, request, demand_req)
+        self._add_coverage_constraints_with_slack(model, variables, indices, demand_req)
         
         # 6. One shift per day per staff
-        self._add_one_shift_per_day_constraints(model, x, indices, request)
+        self._add_one_shift_per_day_constraints(model, variables, indices, request)
         
         # 7. Rest constraints (11h)
-        self._add_rest_constraints(model, x, indices, request)
+        self._add_rest_constraints(model, variables, indices, request)
         
         # 8. Weekly contract caps
-        self._add_weekly_contract_hours_constraints(model, x, indices, request)
+        self._add_weekly_contract_hours_constraints(model, variables, indices, request)
         
-        # 9. Set objective (lexicographic via weights)
-        self._set_objective(model, x, u, indices, request)
+        # 9. Per-staff total minutes, shared by symmetry breaking and the objective
+        staff_minutes = self._compute_staff_total_minutes(model, variables, indices, request)
         
-        debug_log(f"MODEL BUILT: #vars={len(x) + len(y) + len(u)}, #constraints={model.NumConstraints() if hasattr(model, 'NumConstraints') else 'unknown'}")
+        # 10. Symmetry breaking among interchangeable staff
+        self._add_symmetry_breaking(model, staff_minutes, indices)
         
-        return model, indices, x, y, u
+        # 11. Set objective (lexicographic via weights)
+        self._set_objective(model, variables, indices, request, staff_minutes)
+        
+        # 12. Warm start from a greedy rota unless the caller supplied hints
+        if not request.hints:
+            self._add_greedy_hints(model, variables, indices, request, demand_req)
+        
+        debug_log(f"MODEL BUILT: #vars={int(x_mask.sum() + y_mask.sum() + u_mask.sum())}, #constraints={model.NumConstraints() if hasattr(model, 'NumConstraints') else 'unknown'}")
+        
+        return model, indices, variables
+    
+    def _add_greedy_hints(self, model: cp_model.CpModel, variables: ModelVariables, indices: ModelIndices, request: SolverRequestModel, demand_req: np.ndarray):
+        """Hint every x/y variable with the greedy rota so search starts from a good incumbent"""
+        picks = self._greedy_warmstart(request, indices, variables, demand_req)
+        picks = self._order_interchangeable_picks(picks, indices, request)
+        for e, d, w, s in np.argwhere(variables.x_mask).tolist():
+            model.AddHint(variables.x[e, d, w, s], int((e, d, w, s) in picks))
+        for e, d, w, s, k in np.argwhere(variables.y_mask).tolist():
+            model.AddHint(variables.y[e, d, w, s, k], int(picks.get((e, d, w, s)) == k))
+        debug_log(f"WARM START: {len(picks)} greedy assignments hinted")
+    
+    def _order_interchangeable_picks(self, picks: Dict[Tuple[int, int, int, int], int], indices: ModelIndices, request: SolverRequestModel) -> Dict[Tuple[int, int, int, int], int]:
+        """Swap greedy schedules within each staff class so minutes are non-increasing in class order
+        
+        Keeps the warm start consistent with the symmetry-breaking constraints;
+        members of a class share every mask and cap, so any permutation of
+        their schedules is equally feasible.
+        """
+        if not indices.staff_classes:
+            return picks
+        minutes = defaultdict(int)
+        for e, d, w, s in picks:
+            minutes[e] += request.shiftTypes[s].durationMinutes
+        
+        # Schedule of the i-th busiest member goes to the i-th member of the class
+        remap = {}
+        for members in indices.staff_classes:
+            by_minutes = sorted(members, key=lambda e: -minutes[e])
+            remap.update(zip(by_minutes, members))
+        return {(remap.get(e, e), d, w, s): k for (e, d, w, s), k in picks.items()}
+    
+    def _greedy_warmstart(self, request: SolverRequestModel, indices: ModelIndices, variables: ModelVariables, demand_req: np.ndarray) -> Dict[Tuple[int, int, int, int], int]:
+        """Greedy rota respecting the hard rules: (e, d, w, s) -> skill position worked
+        
+        Fills skill requirements largest first, each with the eligible staff
+        members who have worked the fewest minutes so far and are still free
+        that day, within their prorated weekly cap and clear of rest conflicts.
+        """
+        _, forbidden_next_day_pairs = self._rest_slot_pairs(indices, request)
+        forbidden = set(forbidden_next_day_pairs)
+        y_mask = variables.y_mask
+        
+        staff_minutes = [0] * len(request.staff)
+        week_minutes = defaultdict(int)  # (e, week position) -> minutes
+        day_slot = {}  # (e, d) -> slot worked
+        picks = {}
+        
+        skills = list(indices.skill_idx)
+        cells = np.argwhere(demand_req > 0)
+        order = np.argsort(-demand_req[tuple(cells.T)], kind="stable")
+        for d, w, s, k in cells[order].tolist():
+            required = int(demand_req[d, w, s, k])
+            ward_id, skill = indices.ward_ids[w], skills[k]
+            duration = request.shiftTypes[s].durationMinutes
+            wk = int(indices.date_week[d])
+            
+            candidates = []
+            for e in indices.staff_by_skill_ward.get((skill, ward_id), ()):
+                if not y_mask[e, d, w, s, k] or (e, d) in day_slot:
+                    continue
+                if week_minutes[(e, wk)] + duration > indices.week_caps[e, wk]:
+                    continue
+                if (day_slot.get((e, d - 1)), s) in forbidden or (s, day_slot.get((e, d + 1))) in forbidden:
+                    continue
+                candidates.append(e)
+            
+            candidates.sort(key=lambda e: staff_minutes[e])
+            for e in candidates[:required]:
+                picks[(e, d, w, s)] = k
+                day_slot[(e, d)] = s
+                staff_minutes[e] += duration
+                week_minutes[(e, wk)] += duration
+        
+        return picks
+    
+    def _phase1_feasibility(self, request: SolverRequestModel, indices: ModelIndices, variables: ModelVariables, demand_req: np.ndarray) -> int:
+        """Upper bound on coverable skill requirements from a max-flow relaxation
+        
+        source -> (staff, week) capped by the most shifts the prorated contract
+        allows -> (staff, day) capped at one shift -> (cell, skill) for each
+        eligible skill variable -> sink capped by the requirement. Rest rules
+        are relaxed, so the flow can only overestimate what the CP model covers.
+        """
+        n_staff, n_dates = len(request.staff), len(indices.dates)
+        shortest_shift = min((st.durationMinutes for st in request.shiftTypes), default=0)
+        n_weeks = len(indices.week_bins)
+        days_in_week = [len(week_dates) for week_dates in indices.week_bins.values()]
+        
+        # Node numbering: source, sink, staff-week, staff-day, cell-skill
+        source, sink = 0, 1
+        staff_week_base = 2
+        staff_day_base = staff_week_base + n_staff * n_weeks
+        cell_base = staff_day_base + n_staff * n_dates
+        cell_node = {}
+        
+        tails, heads, capacities = [], [], []
+        for e in range(n_staff):
+            for wk in range(n_weeks):
+                cap = int(indices.week_caps[e, wk])
+                max_shifts = days_in_week[wk] if shortest_shift <= 0 else min(days_in_week[wk], cap // shortest_shift)
+                tails.append(source)
+                heads.append(staff_week_base + e * n_weeks + wk)
+                capacities.append(max_shifts)
+            for d in range(n_dates):
+                tails.append(staff_week_base + e * n_weeks + int(indices.date_week[d]))
+                heads.append(staff_day_base + e * n_dates + d)
+                capacities.append(1)
+        
+        skills = list(indices.skill_idx)
+        for d, w, s, k in np.argwhere(demand_req > 0).tolist():
+            cell_skill = (d, w, s, k)
+            node = cell_node.setdefault(cell_skill, cell_base + len(cell_node))
+            tails.append(node)
+            heads.append(sink)
+            capacities.append(int(demand_req[cell_skill]))
+            for e in indices.staff_by_skill_ward.get((skills[k], indices.ward_ids[w]), ()):
+                if variables.y_mask[(e,) + cell_skill]:
+                    tails.append(staff_day_base + e * n_dates + d)
+                    heads.append(node)
+                    capacities.append(1)
+        
+        if not cell_node:
+            return 0
+        flow = max_flow.SimpleMaxFlow()
+        flow.add_arcs_with_capacity(
+            np.array(tails, dtype=np.int32), np.array(heads, dtype=np.int32), np.array(capacities, dtype=np.int64)
+        )
+        if flow.solve(source, sink) != flow.OPTIMAL:
+            # Fall back to the trivial bound (everything coverable)
+            return sum(capacities[i] for i, head in enumerate(heads) if head == sink)
+        return flow.optimal_flow()
+    
+    def _cell_index(self, indices: ModelIndices, date_str: str, ward_id: str, slot: str) -> Optional[Tuple[int, int, int]]:
+        """Integer (date, ward, slot) index of a cell, or None outside the model"""
+        d = indices.date_idx.get(date_str)
+        w = indices.ward_idx.get(ward_id)
+        s = indices.slot_idx.get(slot)
+        if d is None or w is None or s is None:
+            return None
+        return d, w, s
     
-    def _add_feasibility_links(self, model: cp_model.CpModel, x: Dict, y: Dict, request: SolverRequestModel, has_demand_cell: Dict):
+    def _add_feasibility_links(self, model: cp_model.CpModel, variables: ModelVariables, indices: ModelIndices, request: SolverRequestModel):
         """Add feasibility links between x and y variables"""
-        for staff in request.staff:
-            for date_str in self._get_dates(request.horizon):
-                for slot in [st.code for st in request.shiftTypes]:
-                    for ward in request.wards:
-                        cell_key = (date_str, ward.id, slot)
-                        x_var_name = f"x_{staff.id}_{date_str}_{slot}_{ward.id}"
-                        
-                        # If cell has no demand, forbid assignment
-                        if cell_key not in has_demand_cell:
-                            if x_var_name in x:
-                                model.Add(x[x_var_name] == 0)
-                            continue
-                        
-                        # If staff not eligible for ward, forbid assignment
-                        if ward.id not in staff.eligibleWards:
-                            if x_var_name in x:
-                                model.Add(x[x_var_name] == 0)
-                            continue
-                        
-                        # Add feasibility links for skills
-                        skill_vars = []
-                        for skill in staff.skills:
-                            y_var_name = f"y_{staff.id}_{date_str}_{slot}_{ward.id}_{skill}"
-                            if y_var_name in y:
-                                # y[e,d,w,s,k] ≤ x[e,d,w,s]
-                                model.Add(y[y_var_name] <= x[x_var_name])
-                                skill_vars.append(y[y_var_name])
-                        
-                        # Σ_k y[e,d,w,s,k] ≤ x[e,d,w,s] (one skill per person per shift)
-                        if skill_vars:
-                            model.Add(sum(skill_vars) <= x[x_var_name])
+        x, y, y_mask = variables.x, variables.y, variables.y_mask
+        for e, staff in enumerate(request.staff):
+            eligible_wards = [ward_id in staff.eligible_ward_set for ward_id in indices.ward_ids]
+            for d, w, s in np.argwhere(variables.x_mask[e]).tolist():
+                x_var = x[e, d, w, s]
+                
+                # If staff not eligible for ward, forbid assignment (no y
+                # variables exist for the cell)
+                if not eligible_wards[w]:
+                    model.Add(x_var == 0)
+                    continue
+                
+                # Σ_k y[e,d,w,s,k] ≤ x[e,d,w,s] (one skill per person per shift;
+                # with boolean y this also gives each y[e,d,w,s,k] ≤ x[e,d,w,s])
+                skill_vars = y[e, d, w, s][y_mask[e, d, w, s]].tolist()
+                if skill_vars:
+                    model.Add(sum(skill_vars) <= x_var)
     
     def _collect_skills(self, request: SolverRequestModel) -> List[str]:
         """Collect distinct skills from demand requirements"""
         skills = set()
         for demand in request.demand:
-            if isinstance(demand.requirements, dict):
-                skills.update(demand.requirements.keys())
+            skills.update(demand.requirements.keys())
         return list(skills)
     
-    def _build_demand_lookup(self, request: SolverRequestModel) -> Tuple[Dict, Dict]:
-        """Build demand requirement lookup and demand cell mask"""
-        demand_req = {}  # (d, w, s, skill) -> integer requirement
-        has_demand_cell = {}  # (d, w, s) -> boolean
+    def _build_demand_lookup(self, request: SolverRequestModel, indices: ModelIndices) -> Tuple[np.ndarray, np.ndarray]:
+        """Build the demand requirement tensor and demand cell mask
+        
+        Returns required[date, ward, slot, skill] (0 where nothing is required)
+        and a [date, ward, slot] mask of cells with a demand row. Demand outside
+        the horizon, wards or shift types of the request is dropped.
+        """
+        required = np.zeros((len(indices.dates), len(indices.ward_ids), len(indices.slots), len(indices.skill_idx)), dtype=np.int32)
+        has_demand_cell = np.zeros(required.shape[:3], dtype=bool)
         
         for demand in request.demand:
-            if not isinstance(demand.requirements, dict):
-                raise TypeError(f"Requirements must be dict, got {type(demand.requirements)}: {demand.requirements}")
-            
-            cell_key = (demand.date, demand.wardId, demand.slot)
-            has_demand_cell[cell_key] = True
+            cell = self._cell_index(indices, demand.date, demand.wardId, demand.slot)
+            if cell is None:
+                continue
+            has_demand_cell[cell] = True
             
             for skill, count in demand.requirements.items():
-                key = (demand.date, demand.wardId, demand.slot, skill)
-                demand_req[key] = count
+                required[cell + (indices.skill_idx[skill],)] = count
         
-        return demand_req, has_demand_cell
+        return required, has_demand_cell
     
-    def _add_coverage_constraints_with_slack(self, model: cp_model.CpModel, y: Dict, u: Dict, request: SolverRequestModel, demand_req: Dict):
+    def _add_coverage_constraints_with_slack(self, model: cp_model.CpModel, variables: ModelVariables, indices: ModelIndices, demand_req: np.ndarray):
         """Add coverage constraints with slack variables for unmet demand"""
-        for (d, w, s, skill), required in demand_req.items():
-            # Find eligible staff for this ward/skill combination
-            eligible_vars = []
-            for staff in request.staff:
-                if (skill in staff.skills and w in staff.eligibleWards):
-                    var_name = f"y_{staff.id}_{d}_{s}_{w}_{skill}"
-                    if var_name in y:
-                        eligible_vars.append(y[var_name])
+        y, y_mask = variables.y, variables.y_mask
+        skills = list(indices.skill_idx)
+        for d, w, s, k in np.argwhere(demand_req > 0).tolist():
+            required = int(demand_req[d, w, s, k])
+            
+            # Eligible staff for this ward/skill combination
+            eligible_vars = [
+                y[e, d, w, s, k]
+                for e in indices.staff_by_skill_ward.get((skills[k], indices.ward_ids[w]), ())
+                if y_mask[e, d, w, s, k]
+            ]
             
             # Coverage constraint: sum of eligible staff + slack = required
-            slack_var_name = f"u_{d}_{s}_{w}_{skill}"
-            if slack_var_name in u:
-                if eligible_vars:
-                    model.Add(sum(eligible_vars) + u[slack_var_name] == required)
-                else:
-                    # No eligible staff - all demand becomes unmet
-                    model.Add(u[slack_var_name] == required)
+            slack_var = variables.u[d, w, s, k]
+            if eligible_vars:
+                model.Add(sum(eligible_vars) + slack_var == required)
+            else:
+                # No eligible staff - all demand becomes unmet
+                model.Add(slack_var == required)
     
-    def _add_one_shift_per_day_constraints(self, model: cp_model.CpModel, x: Dict, indices: ModelIndices, request: SolverRequestModel):
+    def _add_one_shift_per_day_constraints(self, model: cp_model.CpModel, variables: ModelVariables, indices: ModelIndices, request: SolverRequestModel):
         """H2: One shift per day per staff"""
-        for staff in request.staff:
-            for date_str in self._get_dates(request.horizon):
-                day_vars = []
-                for slot in [st.code for st in request.shiftTypes]:
-                    for ward in request.wards:
-                        var_name = f"x_{staff.id}_{date_str}_{slot}_{ward.id}"
-                        if var_name in x:
-                            day_vars.append(x[var_name])
+        x, x_mask = variables.x, variables.x_mask
+        for e in range(len(request.staff)):
+            for d in range(len(indices.dates)):
+                day_vars = x[e, d][x_mask[e, d]].tolist()
                 
                 if day_vars:
-                    model.Add(sum(day_vars) <= 1)
+                    model.AddAtMostOne(day_vars)
     
-    def _add_rest_constraints(self, model: cp_model.CpModel, x: Dict, indices: ModelIndices, request: SolverRequestModel):
+    def _add_rest_constraints(self, model: cp_model.CpModel, variables: ModelVariables, indices: ModelIndices, request: SolverRequestModel):
         """H3: Rest adjacency constraints - enforce 11h rest between shifts"""
-        dates = self._get_dates(request.horizon)
-        
-        for staff in request.staff:
-            # (a) Same day overlap constraints
-            for date_str in dates:
-                for i, shift1 in enumerate(request.shiftTypes):
-                    for j, shift2 in enumerate(request.shiftTypes):
-                        if i != j:  # Different shifts
-                            # Check if these shifts overlap on the same day
-                            if self._shifts_overlap_same_day(shift1, shift2):
-                                for ward1 in request.wards:
-                                    for ward2 in request.wards:
-                                        var1_name = f"x_{staff.id}_{date_str}_{shift1.code}_{ward1.id}"
-                                        var2_name = f"x_{staff.id}_{date_str}_{shift2.code}_{ward2.id}"
-                                        if var1_name in x and var2_name in x:
-                                            model.Add(x[var1_name] + x[var2_name] <= 1)
-            
-            # (b) Consecutive days rest constraints
-            for i in range(len(dates) - 1):
-                date1 = dates[i]
-                date2 = dates[i + 1]
-                
-                for shift1 in request.shiftTypes:
-                    for shift2 in request.shiftTypes:
-                        # Check if rest between shifts is insufficient
-                        if indices.forbidden_adjacency[shift1.id][shift2.id]:
-                            for ward1 in request.wards:
-                                for ward2 in request.wards:
-                                    var1_name = f"x_{staff.id}_{date1}_{shift1.code}_{ward1.id}"
-                                    var2_name = f"x_{staff.id}_{date2}_{shift2.code}_{ward2.id}"
-                                    if var1_name in x and var2_name in x:
-                                        model.Add(x[var1_name] + x[var2_name] <= 1)
-    
-    def _shifts_overlap_same_day(self, shift1, shift2) -> bool:
-        """Check if two shifts overlap on the same day"""
-        # Parse shift times
-        start1 = datetime.strptime(shift1.start, "%H:%M")
-        end1 = datetime.strptime(shift1.end, "%H:%M")
-        start2 = datetime.strptime(shift2.start, "%H:%M")
-        end2 = datetime.strptime(shift2.end, "%H:%M")
+        x = variables.x
+        for e, d1, w1, s1, d2, w2, s2 in self._prepare_rest_pairs(variables.x_mask, indices, request).tolist():
+            model.AddAtMostOne(x[e, d1, w1, s1], x[e, d2, w2, s2])
+    
+    def _prepare_rest_pairs(self, x_mask: np.ndarray, indices: ModelIndices, request: SolverRequestModel) -> np.ndarray:
+        """Pairs of x cells one staff member cannot both work, as rows of (e, d1, w1, s1, d2, w2, s2)"""
+        overlap_pairs, forbidden_next_day_pairs = self._rest_slot_pairs(indices, request)
+        blocks = [np.empty((0, 7), dtype=np.int64)]
+        
+        # (a) Same day overlaps, (b) too little rest into the next day
+        for day_offset, slot_pairs in ((0, overlap_pairs), (1, forbidden_next_day_pairs)):
+            first_days = x_mask[:, :x_mask.shape[1] - day_offset]
+            next_days = x_mask[:, day_offset:]
+            for s1, s2 in slot_pairs:
+                # [staff, date, ward1, ward2] cells where both shifts could be worked
+                both = first_days[:, :, :, s1, np.newaxis] & next_days[:, :, np.newaxis, :, s2]
+                e, d, w1, w2 = np.nonzero(both)
+                blocks.append(np.column_stack((
+                    e, d, w1, np.full_like(e, s1), d + day_offset, w2, np.full_like(e, s2)
+                )))
+        
+        return np.concatenate(blocks)
+    
+    def _rest_slot_pairs(self, indices: ModelIndices, request: SolverRequestModel) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """Slot pairs that overlap on the same day, and that leave too little rest on consecutive days"""
+        overlap_pairs = []
+        forbidden_next_day_pairs = []
+        for i, shift1 in enumerate(request.shiftTypes):
+            times1 = indices.shift_minutes[shift1.id]
+            s1 = indices.slot_idx[shift1.code]
+            for j, shift2 in enumerate(request.shiftTypes):
+                times2 = indices.shift_minutes[shift2.id]
+                s2 = indices.slot_idx[shift2.code]
+                if i != j and self._shifts_overlap_same_day(times1, times2):
+                    overlap_pairs.append((s1, s2))
+                if self._insufficient_rest(times1, times2):
+                    forbidden_next_day_pairs.append((s1, s2))
+        return overlap_pairs, forbidden_next_day_pairs
+    
+    def _shift_minutes(self, shift) -> Tuple[int, int]:
+        """Start and end of a shift in minutes from midnight (night shifts end the next day)"""
+        start_min = _hhmm_to_minutes(shift.start)
+        end_min = _hhmm_to_minutes(shift.end)
         
         # Handle night shifts that cross midnight
-        if shift1.isNight:
-            end1 = end1 + timedelta(days=1)
-        if shift2.isNight:
-            end2 = end2 + timedelta(days=1)
+        if shift.isNight:
+            end_min += 24 * 60
+        return start_min, end_min
+    
+    def _shifts_overlap_same_day(self, times1: Tuple[int, int], times2: Tuple[int, int]) -> bool:
+        """Check if two shifts, given as (start, end) minutes, overlap on the same day"""
+        start1, end1 = times1
+        start2, end2 = times2
         
         # Check overlap
         return not (end1 <= start2 or end2 <= start1)
     
-    def _add_weekly_contract_hours_constraints(self, model: cp_model.CpModel, x: Dict, indices: ModelIndices, request: SolverRequestModel):
+    def _add_weekly_contract_hours_constraints(self, model: cp_model.CpModel, variables: ModelVariables, indices: ModelIndices, request: SolverRequestModel):
         """H7: Weekly contract hours constraints with prorating for partial weeks"""
         debug_log(f"Adding weekly contract hours constraints for {len(request.staff)} staff")
         
-        for staff in request.staff:
-            contract_minutes = int(staff.contractHoursPerWeek * 60)  # Convert to minutes
-            debug_log(f"Staff {staff.id}: contract hours = {staff.contractHoursPerWeek}h = {contract_minutes} minutes")
+        for e, wk, week_vars, week_minutes in self._prepare_weekly_caps(variables, indices, request):
+            # Constrain total minutes in week to not exceed prorated cap
+            prorated_cap = int(indices.week_caps[e, wk])
+            model.Add(cp_model.LinearExpr.WeightedSum(week_vars, week_minutes) <= prorated_cap)
+    
+    def _prepare_weekly_caps(self, variables: ModelVariables, indices: ModelIndices, request: SolverRequestModel) -> List[Tuple[int, int, list, List[int]]]:
+        """(staff, week, x vars, shift minutes) for every staff week with assignable shifts"""
+        x, x_mask = variables.x, variables.x_mask
+        slot_minutes = np.array([st.durationMinutes for st in request.shiftTypes], dtype=np.int64)
+        cell_minutes = np.broadcast_to(slot_minutes, x_mask.shape[1:])
+        week_keys = list(indices.week_bins)
+        prepared = []
+        
+        for wk in range(len(week_keys)):
+            # [date, ward, slot] cells of this week
+            in_week = np.broadcast_to((indices.date_week == wk)[:, np.newaxis, np.newaxis], x_mask.shape[1:])
+            week_cell_minutes = cell_minutes[in_week].tolist()
             
-            for week_key, week_dates in indices.week_bins.items():
-                # Calculate prorated cap for this week
-                days_in_week = len(week_dates)
-                prorated_cap = int(contract_minutes * (days_in_week / 7.0))
-                
-                debug_log(f"  Week {week_key}: {days_in_week} days, prorated cap = {prorated_cap} minutes")
-                
-                # Sum all minutes assigned to this staff in this week
-                week_minutes_vars = []
-                for date_str in week_dates:
-                    for shift_type in request.shiftTypes:
-                        for ward in request.wards:
-                            var_name = f"x_{staff.id}_{date_str}_{shift_type.code}_{ward.id}"
-                            if var_name in x:
-                                # Create a variable for minutes assigned by this assignment
-                                minutes_var = model.NewIntVar(0, shift_type.durationMinutes, f"minutes_{var_name}")
-                                model.Add(minutes_var == shift_type.durationMinutes * x[var_name])
-                                week_minutes_vars.append(minutes_var)
-                
-                if week_minutes_vars:
-                    # Constrain total minutes in week to not exceed prorated cap
-                    model.Add(sum(week_minutes_vars) <= prorated_cap)
-                    debug_log(f"    Added constraint: sum(week_minutes_vars) <= {prorated_cap}")
+            for e, staff in enumerate(request.staff):
+                cells = x_mask[e][in_week]
+                if cells.any():
+                    prepared.append((e, wk, x[e][in_week][cells].tolist(), np.compress(cells, week_cell_minutes).tolist()))
                 else:
-                    debug_log(f"    No assignments possible for staff {staff.id} in week {week_key}")
+                    debug_log(f"    No assignments possible for staff {staff.id} in week {week_keys[wk]}")
+        
+        return prepared
+    
+    def _add_symmetry_breaking(self, model: cp_model.CpModel, staff_minutes: Dict[int, cp_model.IntVar], indices: ModelIndices):
+        """Order total minutes within each class of interchangeable staff
+        
+        Staff with the same skills, contract and eligible wards can swap whole
+        schedules without changing feasibility or objective, so requiring
+        minutes[a] >= minutes[b] for consecutive members a < b keeps at least
+        one optimal solution while cutting the permuted copies. (Ordering
+        individual cells, x[a] >= x[b], would wrongly forbid b working a shift
+        a does not.)
+        """
+        n_constraints = 0
+        for members in indices.staff_classes:
+            for a, b in zip(members, members[1:]):
+                if a in staff_minutes and b in staff_minutes:
+                    model.Add(staff_minutes[a] >= staff_minutes[b])
+                    n_constraints += 1
+        debug_log(f"SYMMETRY: {len(indices.staff_classes)} staff classes, {n_constraints} ordering constraints")
     
-    def _set_objective(self, model: cp_model.CpModel, x: Dict, u: Dict, indices: ModelIndices, request: SolverRequestModel):
+    def _set_objective(self, model: cp_model.CpModel, variables: ModelVariables, indices: ModelIndices, request: SolverRequestModel, staff_minutes: Dict[int, cp_model.IntVar]):
         """Set objective function with lexicographic weights"""
         objective_terms = []
-        
-        # A * Σ u[d,w,s,k] - unmet demand (dominant)
-        if u:
-            total_unmet = sum(u.values())
-            objective_terms.append(self.A * total_unmet)
-        
-        # D * staff utilization penalty - encourage staff to work more hours
-        if x:
-            utilization_penalty = self._create_utilization_penalty(model, x, indices, request)
-            objective_terms.append(self.D * utilization_penalty)
-        
-        # B * fairness penalty - variance in total minutes per staff
-        if x:
-            fairness_penalty = self._create_fairness_penalty(model, x, indices, request)
-            objective_terms.append(self.B * fairness_penalty)
+        A, B, D = self._compute_weights(request, indices)
+        debug_log(f"OBJECTIVE WEIGHTS: unmet A={A}, fairness B={B}, utilization D={D}")
+        
+        # A * Σ u[d,w,s,k] - unmet demand
+        if variables.u_mask.any():
+            total_unmet = sum(variables.u[variables.u_mask].tolist())
+            objective_terms.append(A * total_unmet)
+        
+        if variables.x_mask.any():
+            # D * staff utilization penalty - encourage staff to work more hours
+            utilization_penalty = self._create_utilization_penalty(model, staff_minutes)
+            objective_terms.append(D * utilization_penalty)
+            
+            # B * fairness penalty - spread of total minutes per staff
+            fairness_penalty = self._create_fairness_penalty(model, staff_minutes, indices)
+            objective_terms.append(B * fairness_penalty)
         
         # Set objective
         if objective_terms:
             model.Minimize(sum(objective_terms))
     
-    def _create_fairness_penalty(self, model: cp_model.CpModel, x: Dict, indices: ModelIndices, request: SolverRequestModel) -> cp_model.IntVar:
-        """Create fairness penalty based on variance in total minutes per staff"""
-        # Calculate total minutes for each staff
+    def _compute_weights(self, request: SolverRequestModel, indices: ModelIndices) -> Tuple[int, int, int]:
+        """Power-of-two objective weights (A, B, D) just large enough to rank the terms
+        
+        Each minute of utilization (D) outweighs any change in unmet demand,
+        and each unit of unmet demand (A) outweighs any change in the fairness
+        penalty (B), using the bounds of the terms for this request.
+        """
+        max_unmet = sum(sum(demand.requirements.values()) for demand in request.demand)
+        # Fairness deviations are bounded by their variable domains
+        max_cap = int(indices.week_caps.sum(axis=1).max()) if len(request.staff) else 0
+        max_fairness = len(request.staff) * max(10000, max_cap)
+        
+        B = 1
+        A = _next_pow2(max_fairness * B + 1)
+        D = _next_pow2(max_unmet * A + max_fairness * B + 1)
+        return A, B, D
+    
+    def _compute_staff_total_minutes(self, model: cp_model.CpModel, variables: ModelVariables, indices: ModelIndices, request: SolverRequestModel) -> Dict[int, cp_model.IntVar]:
+        """Total assigned minutes of each staff member with any possible assignment"""
+        x, x_mask = variables.x, variables.x_mask
+        named = logger.isEnabledFor(logging.DEBUG)
         staff_minutes = {}
-        for staff in request.staff:
-            minutes_vars = []
-            for date_str in self._get_dates(request.horizon):
+        for e, staff in enumerate(request.staff):
+            staff_vars = []
+            durations = []
+            for d in range(len(indices.dates)):
                 for shift_type in request.shiftTypes:
-                    for ward in request.wards:
-                        var_name = f"x_{staff.id}_{date_str}_{shift_type.code}_{ward.id}"
-                        if var_name in x:
-                            # Create minutes variable for this assignment
-                            minutes_var = model.NewIntVar(0, shift_type.durationMinutes, f"minutes_{var_name}")
-                            model.Add(minutes_var == shift_type.durationMinutes * x[var_name])
-                            minutes_vars.append(minutes_var)
+                    s = indices.slot_idx[shift_type.code]
+                    for w in range(len(request.wards)):
+                        if x_mask[e, d, w, s]:
+                            staff_vars.append(x[e, d, w, s])
+                            durations.append(shift_type.durationMinutes)
             
-            if minutes_vars:
-                total_minutes = model.NewIntVar(0, 10000, f"total_minutes_{staff.id}")
-                model.Add(total_minutes == sum(minutes_vars))
-                staff_minutes[staff.id] = total_minutes
-        
+            if staff_vars:
+                total_minutes = model.NewIntVar(0, 10000, f"total_minutes_{staff.id}" if named else "")
+                model.Add(total_minutes == cp_model.LinearExpr.WeightedSum(staff_vars, durations))
+                staff_minutes[e] = total_minutes
+        return staff_minutes
+    
+    def _create_fairness_penalty(self, model: cp_model.CpModel, staff_minutes: Dict[int, cp_model.IntVar], indices: ModelIndices) -> cp_model.LinearExpr:
+        """Create fairness penalty: total absolute deviation of staff minutes from a shared target"""
         if len(staff_minutes) < 2:
             return model.NewConstant(0)
         
-        # Calculate variance (max - min)
-        max_minutes = model.NewIntVar(0, 10000, "max_minutes")
-        min_minutes = model.NewIntVar(0, 10000, "min_minutes")
-        
-        minutes_list = list(staff_minutes.values())
-        model.AddMaxEquality(max_minutes, minutes_list)
-        model.AddMinEquality(min_minutes, minutes_list)
+        # Target: average contract minutes over the horizon (prorated weekly caps)
+        target = int(np.mean([indices.week_caps[e].sum() for e in staff_minutes]))
         
-        variance = model.NewIntVar(0, 10000, "variance")
-        model.Add(variance == max_minutes - min_minutes)
+        # Σ |minutes_e - target| is linear in |staff| and tighter in the LP
+        # relaxation than a max - min range
+        named = logger.isEnabledFor(logging.DEBUG)
+        deviations = []
+        for e, total_minutes in staff_minutes.items():
+            deviation = model.NewIntVar(0, max(10000, target), f"fairness_dev_{e}" if named else "")
+            model.AddAbsEquality(deviation, total_minutes - target)
+            deviations.append(deviation)
         
-        return variance
+        return sum(deviations)
     
-    def _create_utilization_penalty(self, model: cp_model.CpModel, x: Dict, indices: ModelIndices, request: SolverRequestModel) -> cp_model.IntVar:
+    def _create_utilization_penalty(self, model: cp_model.CpModel, staff_minutes: Dict[int, cp_model.IntVar]) -> cp_model.IntVar:
         """Create utilization penalty to encourage staff to work more hours"""
-        # Calculate total minutes for each staff
-        staff_minutes = {}
-        for staff in request.staff:
-            minutes_vars = []
-            for date_str in self._get_dates(request.horizon):
-                for shift_type in request.shiftTypes:
-                    for ward in request.wards:
-                        var_name = f"x_{staff.id}_{date_str}_{shift_type.code}_{ward.id}"
-                        if var_name in x:
-                            # Create minutes variable for this assignment
-                            minutes_var = model.NewIntVar(0, shift_type.durationMinutes, f"minutes_{var_name}")
-                            model.Add(minutes_var == shift_type.durationMinutes * x[var_name])
-                            minutes_vars.append(minutes_var)
-            
-            if minutes_vars:
-                total_minutes = model.NewIntVar(0, 10000, f"total_minutes_{staff.id}")
-                model.Add(total_minutes == sum(minutes_vars))
-                staff_minutes[staff.id] = total_minutes
-        
         if not staff_minutes:
             return model.NewConstant(0)
         
+        named = logger.isEnabledFor(logging.DEBUG)
+        
         # Calculate total minutes across all staff
-        total_minutes = model.NewIntVar(0, 100000, "total_all_staff_minutes")
+        total_minutes = model.NewIntVar(0, 100000, "total_all_staff_minutes" if named else "")
         model.Add(total_minutes == sum(staff_minutes.values()))
         
         # We want to maximize total minutes, so we minimize the negative
         # This encourages the solver to assign more shifts
-        utilization_penalty = model.NewIntVar(-100000, 0, "utilization_penalty")
+        utilization_penalty = model.NewIntVar(-100000, 0, "utilization_penalty" if named else "")
         model.Add(utilization_penalty == -total_minutes)
         return utilization_penalty
     
     def _create_indices(self, request: SolverRequestModel) -> ModelIndices:
         """Create efficient lookup indices"""
+        dates_np = self._get_dates(request.horizon)
+        dates = tuple(dates_np.astype(str).tolist())
+        slots = tuple(st.code for st in request.shiftTypes)
+        ward_ids = tuple(ward.id for ward in request.wards)
+        
         staff_idx = {staff.id: i for i, staff in enumerate(request.staff)}
-        ward_idx = {ward.id: i for i, ward in enumerate(request.wards)}
-        date_idx = {date_str: i for i, date_str in enumerate(self._get_dates(request.horizon))}
-        slot_idx = {st.code: i for i, st in enumerate(request.shiftTypes)}
+        ward_idx = {ward_id: i for i, ward_id in enumerate(ward_ids)}
+        date_idx = {date_str: i for i, date_str in enumerate(dates)}
+        slot_idx = {slot: i for i, slot in enumerate(slots)}
         
         # Build skill index
         skills = self._collect_skills(request)
@@ -648,28 +905,50 @@ class RotaSolverCore:
         # Build shift type index
         shift_type_idx = {st.id: i for i, st in enumerate(request.shiftTypes)}
         
-        # Build week bins
-        week_bins = {}
+        # Build week bins: Monday-based week numbers from day offsets (1970-01-01
+        # was a Thursday), grouped with np.unique
+        week_nums = (dates_np.astype(np.int64) + 3) // 7
+        unique_weeks, date_week = np.unique(week_nums, return_inverse=True)
+        date_week = date_week.astype(np.int32).ravel()
+        
+        # ISO year and week of each week from its Thursday
+        thursdays = (unique_weeks * 7).astype('datetime64[D]')
+        iso_years = thursdays.astype('datetime64[Y]')
+        iso_weeks = (thursdays - iso_years.astype('datetime64[D]')).astype(np.int64) // 7 + 1
+        week_keys = [
+            f"{iso_year}-{iso_week:02d}"
+            for iso_year, iso_week in zip((iso_years.astype(np.int64) + 1970).tolist(), iso_weeks.tolist())
+        ]
+        week_bins = {week_key: [] for week_key in week_keys}
         week_idx = {}
-        dates = self._get_dates(request.horizon)
-        for date_str in dates:
-            date_obj = date.fromisoformat(date_str)
-            week_key = f"{date_obj.isocalendar()[0]}-{date_obj.isocalendar()[1]:02d}"
-            if week_key not in week_bins:
-                week_bins[week_key] = []
-            week_bins[week_key].append(date_str)
-            week_idx[date_str] = week_key
+        for date_str, wk in zip(dates, date_week.tolist()):
+            week_bins[week_keys[wk]].append(date_str)
+            week_idx[date_str] = week_keys[wk]
+        
+        # Each staff member's contract minutes prorated to the days of each
+        # week inside the horizon
+        days_in_week = np.bincount(date_week, minlength=len(week_keys)).astype(np.float64)
+        contract_minutes = np.array([int(staff.contractHoursPerWeek * 60) for staff in request.staff], dtype=np.float64)
+        week_caps = (contract_minutes[:, np.newaxis] * (days_in_week / 7.0)).astype(np.int64)
         
         # Build shift durations
         shift_durations = {st.id: st.durationMinutes for st in request.shiftTypes}
         
-        # Build forbidden adjacency matrix
-        forbidden_adjacency = {}
-        for st1 in request.shiftTypes:
-            forbidden_adjacency[st1.id] = {}
-            for st2 in request.shiftTypes:
-                # Check if rest between shifts is insufficient (11h)
-                forbidden_adjacency[st1.id][st2.id] = self._insufficient_rest(st1, st2)
+        # Parse shift times once
+        shift_minutes = {st.id: self._shift_minutes(st) for st in request.shiftTypes}
+        
+        # Staff holding each skill and eligible for each ward
+        staff_by_skill_ward = defaultdict(list)
+        for i, staff in enumerate(request.staff):
+            for skill in staff.skills:
+                for ward_id in staff.eligibleWards:
+                    staff_by_skill_ward[(skill, ward_id)].append(i)
+        
+        # Interchangeable staff: same skills, contract and eligible wards
+        staff_by_signature = defaultdict(list)
+        for i, staff in enumerate(request.staff):
+            staff_by_signature[(staff.skill_set, staff.contractHoursPerWeek, staff.eligible_ward_set)].append(i)
+        staff_classes = tuple(tuple(members) for members in staff_by_signature.values() if len(members) > 1)
         
         return ModelIndices(
             staff_idx=staff_idx,
@@ -681,73 +960,53 @@ class RotaSolverCore:
             week_bins=week_bins,
             week_idx=week_idx,
             shift_durations=shift_durations,
-            forbidden_adjacency=forbidden_adjacency
+            shift_minutes=shift_minutes,
+            staff_by_skill_ward=dict(staff_by_skill_ward),
+            dates=dates,
+            slots=slots,
+            ward_ids=ward_ids,
+            date_week=date_week,
+            week_caps=week_caps,
+            staff_classes=staff_classes
         )
     
-    def _insufficient_rest(self, shift1, shift2) -> bool:
-        """Check if rest between two shifts is insufficient (less than 11h)"""
-        # Parse shift times
-        start1 = datetime.strptime(shift1.start, "%H:%M")
-        end1 = datetime.strptime(shift1.end, "%H:%M")
-        start2 = datetime.strptime(shift2.start, "%H:%M")
-        end2 = datetime.strptime(shift2.end, "%H:%M")
-        
-        # Handle night shifts that cross midnight
-        if shift1.isNight:
-            end1 = end1 + timedelta(days=1)
-        if shift2.isNight:
-            end2 = end2 + timedelta(days=1)
-        
+    def _insufficient_rest(self, times1: Tuple[int, int], times2: Tuple[int, int]) -> bool:
+        """Check if rest between two shifts, given as (start, end) minutes, is insufficient (less than 11h)"""
         # Calculate rest time (assuming shift2 follows shift1)
-        rest_hours = (start2 - end1).total_seconds() / 3600
-        
-        return rest_hours < 11
-    
-    def _get_dates(self, horizon) -> List[str]:
-        """Get list of dates in horizon"""
-        start_date = date.fromisoformat(horizon.start)
-        end_date = date.fromisoformat(horizon.end)
-        dates = []
-        current = start_date
-        while current <= end_date:
-            dates.append(current.isoformat())
-            current += timedelta(days=1)
-        return dates
-    
-    def _total_required(self, requirements) -> int:
-        """Calculate total required from requirements dict"""
-        if isinstance(requirements, dict):
-            return sum(requirements.values())
-        elif isinstance(requirements, int):
-            return requirements
-        else:
-            raise TypeError(f"Requirements must be dict or int, got {type(requirements)}")
+        rest_minutes = times2[0] - times1[1]
+        
+        return rest_minutes < 11 * 60
+    
+    def _get_dates(self, horizon) -> np.ndarray:
+        """Dates in horizon as a contiguous datetime64[D] array"""
+        return np.arange(np.datetime64(horizon.start, 'D'), np.datetime64(horizon.end, 'D') + 1, dtype='datetime64[D]')
     
-    def _extract_assignments(self, solver: cp_model.CpSolver, x: Dict, indices: ModelIndices, request: SolverRequestModel) -> List[AssignmentModel]:
+    def _total_required_all(self, demands: List[DemandModel]) -> np.ndarray:
+        """Total required of every demand row, in order"""
+        return np.fromiter((sum(demand.requirements.values()) for demand in demands), dtype=np.int64, count=len(demands))
+    
+    def _solution_values(self, solver: cp_model.CpSolver) -> np.ndarray:
+        """Values of every model variable in one copy (empty when no solution was found)"""
+        return np.array(solver.ResponseProto().solution, dtype=np.int64)
+    
+    def _extract_assignments(self, solution: np.ndarray, variables: ModelVariables, indices: ModelIndices, request: SolverRequestModel) -> List[AssignmentModel]:
         """Extract assignments from solver solution"""
         assignments = []
-        
-        for var_name, var in x.items():
-            if solver.Value(var) == 1:
-                # Parse variable name: x_{staff_id}_{date}_{slot}_{ward_id}
-                parts = var_name.split('_')
-                if len(parts) >= 5:
-                    staff_id = parts[1]
-                    date_str = parts[2]
-                    slot = parts[3]
-                    ward_id = parts[4]
-                    
-                    # Find shift type ID
-                    shift_type = next((st for st in request.shiftTypes if st.code == slot), None)
-                    if shift_type:
-                        assignment = AssignmentModel(
-                            staffId=staff_id,
-                            wardId=ward_id,
-                            date=date_str,
-                            slot=slot,
-                            shiftTypeId=shift_type.id
-                        )
-                        assignments.append(assignment)
+        if not solution.size:
+            return assignments
+        
+        worked = solution[variables.x_index] == 1
+        for e, d, w, s in np.argwhere(variables.x_mask)[worked].tolist():
+            shift_type = request.shiftTypes[s]
+            # Every field comes from the validated request, so skip re-validation
+            assignment = AssignmentModel.model_construct(
+                staffId=request.staff[e].id,
+                wardId=indices.ward_ids[w],
+                date=indices.dates[d],
+                slot=shift_type.code,
+                shiftTypeId=shift_type.id
+            )
+            assignments.append(assignment)
         
         return assignments
     
@@ -755,15 +1014,20 @@ class RotaSolverCore:
         """Calculate solution metrics"""
         # Calculate fairness (standard deviation of night shifts per staff)
         night_shifts_per_staff = {}
-        night_shift_codes = [st.code for st in request.shiftTypes if st.isNight]
+        night_shift_codes = request.night_shift_codes
         
         for assignment in assignments:
             if assignment.slot in night_shift_codes:
                 night_shifts_per_staff[assignment.staffId] = night_shifts_per_staff.get(assignment.staffId, 0) + 1
         
-        if night_shifts_per_staff:
-            night_counts = list(night_shifts_per_staff.values())
-            fairness_std = np.std(night_counts) if len(night_counts) > 1 else 0.0
+        night_counts = list(night_shifts_per_staff.values())
+        n = len(night_counts)
+        if n > 1000:
+            fairness_std = float(np.std(night_counts))
+        elif n > 1:
+            # Population std in one pass; numpy's dispatch dominates for short lists
+            mean = sum(night_counts) / n
+            fairness_std = max(0.0, sum(c * c for c in night_counts) / n - mean * mean) ** 0.5
         else:
             fairness_std = 0.0
         
@@ -0,0 +1,228 @@
+"""
+Model-build kernels for RotaSolver
+
+Pure functions over the request, the CP-SAT model and a ModelIndex, kept free
+of dynamic attribute access so the module can be compiled with mypyc
+(see solver/setup.py). Variables live in plain nested lists rather than
+numpy object arrays so the compiled loops index them natively. The
+interpreted module is used when no compiled extension has been built.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from ortools.sat.python import cp_model
+
+from .models import AssignmentModel, DemandModel, SolverRequestModel
+
+
+class ModelIndex:
+    """Lookup tables shared by the model-build kernels
+
+    Demand cells are the (date, slot) pairs with demand, numbered in date then
+    slot order; assignment variables are addressed as X[staff][cell].
+    """
+
+    def __init__(self) -> None:
+        self.staff_map: Dict[str, int] = {}
+        self.staff_skills_by_id: Dict[str, Set[str]] = {}
+        self.staff_by_skill: Dict[str, List[int]] = {}
+        self.demand_map: Dict[Tuple[str, str], List[DemandModel]] = {}
+        self.dates: List[str] = []
+        self.date_index: Dict[str, int] = {}
+        self.slots: List[str] = []
+        self.slot_index: Dict[str, int] = {}
+        # (date position, slot position) of each demand cell
+        self.cells: List[Tuple[int, int]] = []
+        self.cell_index: Dict[Tuple[int, int], int] = {}
+        # Demand cells on each date, in slot order
+        self.cells_by_date: List[List[int]] = []
+        # CP-SAT variable index of each X[staff][cell]
+        self.var_index: List[List[int]] = []
+        self.dates_by_week: Dict[int, List[int]] = {}
+        self.shift_map: Dict[str, int] = {}
+        self.slot_to_shift_id: Dict[str, str] = {}
+        self.night_slots: Set[str] = set()
+        self.night_shift_ids: Set[str] = set()
+        self.skill_map: Dict[str, int] = {}
+
+
+def create_mappings(request: SolverRequestModel) -> ModelIndex:
+    """Create efficient lookup mappings"""
+    index = ModelIndex()
+
+    # Staff mapping
+    for i, staff in enumerate(request.staff):
+        index.staff_map[staff.id] = i
+    index.staff_skills_by_id = {staff.id: set(staff.skills) for staff in request.staff}
+
+    # Demand mapping by date and slot
+    for demand in request.demand:
+        key = (demand.date, demand.slot)
+        if key not in index.demand_map:
+            index.demand_map[key] = []
+        index.demand_map[key].append(demand)
+
+    # Dense date/slot indices and the demand cells between them
+    index.dates = sorted(set(demand.date for demand in request.demand))
+    index.date_index = {date: i for i, date in enumerate(index.dates)}
+    index.slots = sorted(set(demand.slot for demand in request.demand))
+    index.slot_index = {slot: i for i, slot in enumerate(index.slots)}
+    index.cells = sorted((index.date_index[date], index.slot_index[slot]) for date, slot in index.demand_map)
+    index.cell_index = {cell: c for c, cell in enumerate(index.cells)}
+    index.cells_by_date = [[] for _ in index.dates]
+    for c, (d_idx, _) in enumerate(index.cells):
+        index.cells_by_date[d_idx].append(c)
+
+    # Monday-based week of each date, counted from the first week in the horizon
+    parsed = [datetime.fromisoformat(date.replace('Z', '+00:00')) for date in index.dates]
+    if parsed:
+        base = parsed[0] - timedelta(days=parsed[0].weekday())
+        for d_idx, dt in enumerate(parsed):
+            index.dates_by_week.setdefault((dt - base).days // 7, []).append(d_idx)
+
+    # Shift type mapping
+    for i, shift in enumerate(request.shiftTypes):
+        index.shift_map[shift.id] = i
+    # First shift type declared for each slot code
+    for shift in request.shiftTypes:
+        index.slot_to_shift_id.setdefault(shift.code, shift.id)
+    index.night_slots = {st.code for st in request.shiftTypes if st.isNight}
+    index.night_shift_ids = {st.id for st in request.shiftTypes if st.isNight}
+
+    # Skill mapping
+    all_skills: Set[str] = set()
+    for staff in request.staff:
+        all_skills.update(staff.skills)
+    for i, skill in enumerate(all_skills):
+        index.skill_map[skill] = i
+
+    # Inverted index: skill -> staff indices holding it
+    for i, staff in enumerate(request.staff):
+        for skill in staff.skills:
+            index.staff_by_skill.setdefault(skill, []).append(i)
+
+    return index
+
+
+def create_variables(model: cp_model.CpModel, index: ModelIndex, n_staff: int,
+                     debug: bool) -> List[List[cp_model.IntVar]]:
+    """Create decision variables"""
+    # X[staff_idx][cell] = 1 if staff is assigned to the demand cell
+    X: List[List[cp_model.IntVar]] = []
+    index.var_index = []
+    for staff_idx in range(n_staff):
+        staff_vars: List[cp_model.IntVar] = []
+        staff_var_index: List[int] = []
+        for d_idx, s_idx in index.cells:
+            # Variable names are only useful when reading search logs
+            name = f"x_{staff_idx}_{d_idx}_{s_idx}" if debug else ""
+            var = model.new_bool_var(name)
+            staff_vars.append(var)
+            staff_var_index.append(var.Index())
+        X.append(staff_vars)
+        index.var_index.append(staff_var_index)
+    return X
+
+
+def x_vars(X: List[List[cp_model.IntVar]]) -> List[cp_model.IntVar]:
+    """All assignment variables as a flat list"""
+    return [var for staff_vars in X for var in staff_vars]
+
+
+def add_coverage_constraints(model: cp_model.CpModel, index: ModelIndex, X: List[List[cp_model.IntVar]]) -> None:
+    """Add coverage constraints to meet demand"""
+    for (date, slot), demands in index.demand_map.items():
+        cell = index.cell_index[(index.date_index[date], index.slot_index[slot])]
+        for demand in demands:
+            for skill, required_count in demand.requirements.items():
+                # Find staff with this skill
+                skilled_staff: List[cp_model.IntVar] = [
+                    X[staff_idx][cell]
+                    for staff_idx in index.staff_by_skill.get(skill, [])
+                ]
+
+                # Ensure enough staff with this skill are assigned
+                if skilled_staff:
+                    if required_count == 1:
+                        model.add_bool_or(skilled_staff)
+                    else:
+                        model.add_linear_constraint(cp_model.LinearExpr.Sum(skilled_staff), required_count, cp_model.INT_MAX)
+
+
+def add_staff_constraints(model: cp_model.CpModel, request: SolverRequestModel, index: ModelIndex,
+                          X: List[List[cp_model.IntVar]]) -> None:
+    """Add staff-specific constraints"""
+    for staff_idx, staff in enumerate(request.staff):
+        staff_vars = X[staff_idx]
+
+        # One shift per day constraint
+        for day_cells in index.cells_by_date:
+            if day_cells:
+                model.add_at_most_one([staff_vars[cell] for cell in day_cells])
+
+        # Contract hours constraint (simplified - max shifts per week)
+        max_shifts_per_week = int(staff.contractHoursPerWeek / 8)  # Assume 8-hour shifts
+        for week_dates in index.dates_by_week.values():
+            week_shifts: List[cp_model.IntVar] = []
+            for d_idx in week_dates:
+                for cell in index.cells_by_date[d_idx]:
+                    week_shifts.append(staff_vars[cell])
+
+            if week_shifts:
+                model.add_linear_constraint(cp_model.LinearExpr.Sum(week_shifts), cp_model.INT_MIN, max_shifts_per_week)
+
+
+def add_fairness_constraints(model: cp_model.CpModel, request: SolverRequestModel, index: ModelIndex,
+                             X: List[List[cp_model.IntVar]], debug: bool) -> Optional[cp_model.LinearExpr]:
+    """Add fairness constraints, returning the night-shift spread to minimize"""
+    # Demand cells whose slot corresponds to a night shift type
+    night_cells = [c for c, (_, s_idx) in enumerate(index.cells) if index.slots[s_idx] in index.night_slots]
+
+    # A staff member can work at most one shift per night cell
+    max_nights_per_staff = len(night_cells)
+    if max_nights_per_staff == 0:
+        return None
+
+    # Minimize variance in night shift distribution by bounding each
+    # staff member's night count between a shared min and max
+    min_nights = model.new_int_var(0, max_nights_per_staff, "min_nights" if debug else "")
+    max_nights = model.new_int_var(0, max_nights_per_staff, "max_nights" if debug else "")
+
+    for staff_idx in range(len(request.staff)):
+        night_shifts = [X[staff_idx][cell] for cell in night_cells]
+        # Fresh sums per bound: CP-SAT may extend a sum expression in place
+        model.add_linear_constraint(cp_model.LinearExpr.Sum(night_shifts) - min_nights, 0, cp_model.INT_MAX)
+        model.add_linear_constraint(cp_model.LinearExpr.Sum(night_shifts) - max_nights, cp_model.INT_MIN, 0)
+
+    return max_nights - min_nights
+
+
+def extract_assignments(solver: cp_model.CpSolver, request: SolverRequestModel,
+                        index: ModelIndex) -> List[AssignmentModel]:
+    """Extract assignments from solver solution"""
+    assignments: List[AssignmentModel] = []
+    # Every variable value in one copy instead of a solver call per variable
+    solution: List[int] = list(solver.ResponseProto().solution)
+    if not solution:
+        return assignments
+
+    for staff_idx, staff_var_index in enumerate(index.var_index):
+        for cell, var_idx in enumerate(staff_var_index):
+            if solution[var_idx] != 1:
+                continue
+            d_idx, s_idx = index.cells[cell]
+            date = index.dates[d_idx]
+            slot = index.slots[s_idx]
+            shift_type_id = index.slot_to_shift_id.get(slot)
+            if shift_type_id:
+                assignments.append(AssignmentModel(
+                    staffId=request.staff[staff_idx].id,
+                    # Cells are shared across wards; report the first ward with demand
+                    wardId=index.demand_map[(date, slot)][0].wardId,
+                    date=date,
+                    slot=slot,
+                    shiftTypeId=shift_type_id
+                ))
+
+    return assignments
@@ -1,8 +1,11 @@
+import os
 import time
+from collections import defaultdict
 from typing import List, Dict, Tuple, Optional, Set
 from datetime import datetime, timedelta
 from ortools.sat.python import cp_model
 import math
+import numpy as np
 
 from .models import (
     SolverRequestModel, RepairRequestModel, AssignmentModel, 
@@ -13,7 +16,9 @@ class SimpleRotaSolver:
     def __init__(self):
         self.model = None
         self.solver = None
-        self.variables = {}
+        self.variables = np.empty((0, 0), dtype=object)
+        self.var_index = np.empty((0, 0), dtype=np.int64)
+        self.demand_idx = {}
         
     def solve(self, request: SolverRequestModel, time_budget_ms: int = 300000) -> SolverResponseModel:
         """Solve the rota problem with a simplified approach"""
@@ -23,6 +28,9 @@ class SimpleRotaSolver:
         self.model = cp_model.CpModel()
         self.solver = cp_model.CpSolver()
         self.solver.parameters.max_time_in_seconds = time_budget_ms / 1000
+        # Run the portfolio of search strategies in parallel, one per core
+        self.solver.parameters.num_search_workers = os.cpu_count() or 8
+        self.solver.parameters.log_search_progress = False
         
         # Build simplified model
         self._build_simple_model(request)
@@ -32,7 +40,7 @@ class SimpleRotaSolver:
         solve_time_ms = int((time.time() - start_time) * 1000)
         
         print(f"DEBUG: Solver status = {status}")
-        print(f"DEBUG: Number of variables = {len(self.variables)}")
+        print(f"DEBUG: Number of variables = {self.variables.size}")
         
         # Process results
         if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
@@ -63,81 +71,99 @@ class SimpleRotaSolver:
         
     def _build_simple_model(self, request: SolverRequestModel):
         """Build a simplified CP-SAT model"""
-        # Create variables: x[staff_id][date][slot] = 1 if assigned
-        for staff in request.staff:
-            for demand in request.demands:
-                var_name = f"x_{staff.id}_{demand.date}_{demand.slot}"
-                self.variables[var_name] = self.model.NewBoolVar(var_name)
+        # Integer positions of staff and of each distinct (date, slot) demand cell
+        staff_idx = {staff.id: i for i, staff in enumerate(request.staff)}
+        self.demand_idx = {}
+        for demand in request.demands:
+            self.demand_idx.setdefault((demand.date, demand.slot), len(self.demand_idx))
+        
+        # Create variables: x[i, j] = 1 if staff i is assigned to demand cell j
+        self.variables = np.empty((len(staff_idx), len(self.demand_idx)), dtype=object)
+        self.var_index = np.empty(self.variables.shape, dtype=np.int64)
+        for i in range(len(staff_idx)):
+            for j in range(len(self.demand_idx)):
+                var = self.model.NewBoolVar(f"x_{i}_{j}")
+                self.variables[i, j] = var
+                self.var_index[i, j] = var.Index()
+        
+        # Staff rows holding each skill, from one pass over staff
+        skill_to_staff_rows = defaultdict(list)
+        for i, staff in enumerate(request.staff):
+            for skill in staff.skills:
+                skill_to_staff_rows[skill].append(i)
         
         # Coverage constraints: meet demand for each skill
         for demand in request.demands:
+            j = self.demand_idx[(demand.date, demand.slot)]
             for skill, required_count in demand.requiredBySkill.items():
-                skilled_staff_vars = []
-                for staff in request.staff:
-                    if skill in staff.skills:
-                        var_name = f"x_{staff.id}_{demand.date}_{demand.slot}"
-                        skilled_staff_vars.append(self.variables[var_name])
-                
-                if skilled_staff_vars:
-                    self.model.Add(sum(skilled_staff_vars) >= required_count)
+                rows = skill_to_staff_rows.get(skill)
+                if rows:
+                    skilled_staff_vars = self.variables[rows, j].tolist()
+                    if required_count == 1:
+                        # At least one: a clause instead of a linear constraint
+                        self.model.AddBoolOr(skilled_staff_vars)
+                    else:
+                        self.model.Add(cp_model.LinearExpr.Sum(skilled_staff_vars) >= required_count)
         
         # One shift per day per staff
-        for staff in request.staff:
-            for date in set(demand.date for demand in request.demands):
-                day_vars = []
-                for demand in request.demands:
-                    if demand.date == date:
-                        var_name = f"x_{staff.id}_{demand.date}_{demand.slot}"
-                        day_vars.append(self.variables[var_name])
-                
-                if day_vars:
-                    self.model.Add(sum(day_vars) <= 1)
+        date_to_cols = defaultdict(list)
+        for (date, slot), j in self.demand_idx.items():
+            date_to_cols[date].append(j)
+        for cols in date_to_cols.values():
+            # One [staff, cell] block per date, split into each person's row
+            for day_vars in self.variables[:, cols].tolist():
+                self.model.AddAtMostOne(day_vars)
         
         # Objective: minimize total assignments
-        all_vars = list(self.variables.values())
+        all_vars = self.variables.ravel().tolist()
         if all_vars:
-            self.model.Minimize(sum(all_vars))
+            self.model.Minimize(cp_model.LinearExpr.Sum(all_vars))
         
     def _extract_simple_assignments(self, request: SolverRequestModel) -> List[AssignmentModel]:
         """Extract assignments from solver solution"""
         assignments = []
         
-        for staff in request.staff:
-            for demand in request.demands:
-                var_name = f"x_{staff.id}_{demand.date}_{demand.slot}"
-                if var_name in self.variables:
-                    if self.solver.Value(self.variables[var_name]) == 1:
-                        # Find the shift type for this slot
-                        shift_type_id = None
-                        for shift in request.shiftTypes:
-                            if shift.code == demand.slot:
-                                shift_type_id = shift.id
-                                break
-                                
-                        if shift_type_id:
-                            assignments.append(AssignmentModel(
-                                staffId=staff.id,
-                                date=demand.date,
-                                slot=demand.slot,
-                                shiftTypeId=shift_type_id
-                            ))
+        # Every variable value in one copy instead of a solver call per variable
+        solution = np.array(self.solver.ResponseProto().solution, dtype=np.int64)
+        if not solution.size:
+            return assignments
+        
+        # First shift type declared for each slot code
+        code_to_id = {}
+        for shift in request.shiftTypes:
+            code_to_id.setdefault(shift.code, shift.id)
+        
+        cells = list(self.demand_idx)
+        for i, j in np.argwhere(solution[self.var_index] == 1).tolist():
+            date, slot = cells[j]
+            shift_type_id = code_to_id.get(slot)
+            if shift_type_id:
+                assignments.append(AssignmentModel(
+                    staffId=request.staff[i].id,
+                    date=date,
+                    slot=slot,
+                    shiftTypeId=shift_type_id
+                ))
                             
         return assignments
         
     def _calculate_simple_metrics(self, assignments: List[AssignmentModel], request: SolverRequestModel, solve_time_ms: int) -> MetricsModel:
         """Calculate solution metrics"""
+        # Skills of each staff member, looked up once per assignment
+        staff_skills = {staff.id: staff.skill_set for staff in request.staff}
+        
+        # Staff assigned to each (date, slot), indexed once
+        assigned_by_slot = defaultdict(list)
+        for assignment in assignments:
+            assigned_by_slot[(assignment.date, assignment.slot)].append(assignment.staffId)
+        
         # Count unfilled demand
         unfilled_demand = 0
         for demand in request.demands:
+            staff_ids = assigned_by_slot.get((demand.date, demand.slot), ())
             for skill, required_count in demand.requiredBySkill.items():
-                assigned_count = 0
-                for assignment in assignments:
-                    if assignment.date == demand.date and assignment.slot == demand.slot:
-                        # Check if assigned staff has the required skill
-                        for staff in request.staff:
-                            if staff.id == assignment.staffId and skill in staff.skills:
-                                assigned_count += 1
-                                break
+                # Count assigned staff with the required skill
+                assigned_count = sum(1 for staff_id in staff_ids if skill in staff_skills.get(staff_id, ()))
                 unfilled_demand += max(0, required_count - assigned_count)
         
         return MetricsModel(
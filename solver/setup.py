@@ -0,0 +1,33 @@
+"""
+Optional mypyc build of the RotaSolver model-build kernels
+
+Compiles app/solver_kernels.py to a C extension next to the source:
+
+    pip install mypy
+    python setup.py build_ext --inplace
+
+mypyc ships with mypy, which pyproject.toml declares as a build requirement.
+Python imports the compiled extension in preference to the .py file. Without
+mypyc, or with DMR_USE_COMPILED=0 (e.g. where no C toolchain is available),
+nothing is compiled and the kernels run as plain Python.
+"""
+
+import os
+
+from setuptools import setup
+
+ext_modules = []
+if os.environ.get("DMR_USE_COMPILED", "1") != "0":
+    try:
+        from mypyc.build import mypycify
+    except ImportError:
+        # mypyc not installed: the kernels stay interpreted
+        pass
+    else:
+        ext_modules = mypycify(["app/solver_kernels.py"])
+
+setup(
+    name="medirota-solver-kernels",
+    packages=[],
+    ext_modules=ext_modules,
+)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Smoke test for the legacy RotaSolver
+Solves 1 ward, 4 staff, 2 shift types, 3 days in-process (no server needed)
+"""
+
+from app.models import SolverRequestModel
+from app.solver import RotaSolver
+
+def create_small_request() -> SolverRequestModel:
+    """Create a small request in the current solver schema"""
+    dates = ["2025-01-06", "2025-01-07", "2025-01-08"]
+    return SolverRequestModel.model_validate({
+        "horizon": {"start": dates[0], "end": dates[-1]},
+        "wards": [{"id": "ward-1", "name": "Ward 1"}],
+        "shiftTypes": [
+            {"id": "day", "code": "DAY", "start": "08:00", "end": "20:00", "isNight": False, "durationMinutes": 720},
+            {"id": "night", "code": "NIGHT", "start": "20:00", "end": "08:00", "isNight": True, "durationMinutes": 720}
+        ],
+        "staff": [
+            {"id": f"staff-{i}", "fullName": f"Staff {i}", "job": "nurse", "contractHoursPerWeek": 37.5,
+             "skills": ["resus"] if i % 2 else ["resus", "ventilator"], "eligibleWards": ["ward-1"]}
+            for i in range(1, 5)
+        ],
+        "demand": [
+            {"wardId": "ward-1", "date": date, "slot": slot, "requirements": {"resus": 1}}
+            for date in dates for slot in ("DAY", "NIGHT")
+        ],
+        "rules": {"minRestHours": 11, "maxConsecutiveNights": 3, "oneShiftPerDay": True},
+        "locks": [{"staffId": "staff-1", "wardId": "ward-1", "date": dates[0], "slot": "NIGHT"}],
+        "preferences": [{"staffId": "staff-2", "date": dates[1], "preferOff": True}]
+    })
+
+def test_rota_solver():
+    """Solve the small request and check the response holds together"""
+    print("🧪 Testing RotaSolver with a small request")
+    print("=" * 50)
+
+    request = create_small_request()
+    response = RotaSolver(num_workers=1).solve(request, time_budget_ms=10000)
+
+    print(f"📊 Solution {response.solutionId}: {len(response.assignments)} assignments")
+    print(f"   - Metrics: {response.metrics.model_dump()}")
+    print(f"   - Notes: {response.diagnostics.notes}")
+
+    # Every demand cell is covered, once per staff member per day
+    cells = {(a.date, a.slot) for a in response.assignments}
+    assert cells == {(d.date, d.slot) for d in request.demand}
+    days = [(a.staffId, a.date) for a in response.assignments]
+    assert len(days) == len(set(days))
+
+    # The lock is honoured
+    assert ("staff-1", "2025-01-06", "NIGHT") in {(a.staffId, a.date, a.slot) for a in response.assignments}
+    assert response.solutionId.startswith("sol_")
+    assert response.metrics.solveMs >= response.metrics.buildMs
+
+    print("   🎉 RotaSolver smoke test passed!")
+
+if __name__ == "__main__":
+    test_rota_solver()
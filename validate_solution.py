@@ -5,25 +5,49 @@ Standalone solution validation utility for MediRota solver.
 Analyzes solver request/response JSON files and generates comprehensive reports
 including coverage analysis, fairness metrics, and CSV snapshots.
 
+Requires numpy (pip install numpy, or use the solver environment:
+pip install -r solver/requirements.txt). orjson and numba are used when
+installed but are optional.
+
 Usage:
     python validate_solution.py
     python validate_solution.py --request ./debug/bundle-YYYYMMDD/solver_request.json --response ./debug/bundle-YYYYMMDD/solver_response.json --outdir ./debug_out
 """
 
 import argparse
+import contextlib
+import csv
+import io
 import json
 import os
 import sys
-from collections import defaultdict
-from typing import Dict, List, Tuple, Optional
-import math
+from typing import Dict, List, NamedTuple, Tuple, Optional
+
+import numpy as np
+
+# orjson is optional: without it JSON is parsed by the stdlib. Its decode
+# error subclasses json.JSONDecodeError, so one except clause covers both.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+# Numba is optional: without it the fairness kernel runs as plain Python
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
 
 
 def load_json(path: str) -> dict:
     """Load JSON file with robust error handling."""
     try:
-        with open(path, 'r') as f:
-            return json.load(f)
+        # Parse the raw bytes so no intermediate str of the whole file is built
+        with open(path, 'rb') as f:
+            return json_loads(f.read())
     except FileNotFoundError:
         print(f"ERROR: File not found: {path}")
         sys.exit(1)
@@ -35,124 +59,218 @@ def load_json(path: str) -> dict:
         sys.exit(1)
 
 
-def build_demand_index(request: dict) -> Tuple[Dict[Tuple[str, str, str], int], Dict[str, int]]:
-    """Build demand index and shift type mapping."""
-    demand_index = {}  # (date, wardId, slot) -> total_required
-    shift_types = {}   # shiftTypeId -> durationMinutes
-    
-    # Build shift type mapping
+def pack_cell_keys(date_id: np.ndarray, ward_id: np.ndarray, slot_id: np.ndarray,
+                   n_wards: int, n_slots: int) -> np.ndarray:
+    """Single int64 key per (date, ward, slot) id triple, unique for in-range ids"""
+    return (date_id * n_wards + ward_id) * n_slots + slot_id
+
+
+class DemandIndex(NamedTuple):
+    """Demand cells as parallel arrays, one entry per distinct (date, wardId, slot)"""
+    date_ids: Dict[str, int]   # date -> date_id, in sorted order
+    ward_ids: Dict[str, int]   # wardId -> ward_id
+    slot_ids: Dict[str, int]   # slot -> slot_id
+    date_id: np.ndarray        # [cell] -> date_id
+    ward_id: np.ndarray        # [cell] -> ward_id
+    slot_id: np.ndarray        # [cell] -> slot_id
+    required: np.ndarray       # [cell] -> total required across skills
+    sorted_keys: np.ndarray    # packed cell keys, ascending
+    sorted_cells: np.ndarray   # cell of each entry in sorted_keys
+    
+    def cell_keys(self) -> List[Tuple[str, str, str]]:
+        """(date, wardId, slot) of each cell, in cell order"""
+        dates, wards, slots = list(self.date_ids), list(self.ward_ids), list(self.slot_ids)
+        return [
+            (dates[d], wards[w], slots[s])
+            for d, w, s in zip(self.date_id.tolist(), self.ward_id.tolist(), self.slot_id.tolist())
+        ]
+    
+    def cells_of(self, date_id: np.ndarray, ward_id: np.ndarray, slot_id: np.ndarray) -> np.ndarray:
+        """Cell of each id triple, -1 where the triple has no demand (ids of -1 mean unknown)"""
+        cells = np.full(date_id.shape, -1, dtype=np.int64)
+        known = (date_id >= 0) & (ward_id >= 0) & (slot_id >= 0)
+        keys = pack_cell_keys(date_id[known], ward_id[known], slot_id[known], len(self.ward_ids), len(self.slot_ids))
+        # Known ids imply at least one demand cell, so clipping pos stays in bounds
+        pos = np.minimum(np.searchsorted(self.sorted_keys, keys), self.sorted_keys.size - 1)
+        hit = self.sorted_keys[pos] == keys
+        cells[np.flatnonzero(known)[hit]] = self.sorted_cells[pos[hit]]
+        return cells
+
+
+def intern_columns(rows: List[Dict], fields: Tuple[str, ...]):
+    """Intern the given string fields of each row in place.
+    
+    Dates, ward ids, slots and staff ids repeat across thousands of rows;
+    sharing one object per distinct value saves memory and lets the dict
+    lookups that follow match on identity.
+    """
+    for row in rows:
+        for field in fields:
+            value = row.get(field)
+            if isinstance(value, str):
+                row[field] = sys.intern(value)
+
+
+def build_shift_type_map(request: dict) -> Dict[str, Tuple[str, int]]:
+    """Map shiftTypeId -> (slot, durationMinutes) in one pass over shift types."""
+    shift_type_map = {}
     for shift_type in request.get('shiftTypes', []):
-        shift_types[shift_type['id']] = shift_type.get('durationMinutes', 0)
-    
-    # Build demand index
-    for demand in request.get('demand', []):
-        cell_key = (demand['date'], demand['wardId'], demand['slot'])
-        requirements = demand.get('requirements', {})
-        
-        # Sum all skill requirements for this cell
-        total_required = sum(requirements.values()) if isinstance(requirements, dict) else 0
-        
-        if cell_key in demand_index:
-            demand_index[cell_key] += total_required
-        else:
-            demand_index[cell_key] = total_required
-    
-    return demand_index, shift_types
+        shift_type_map[shift_type['id']] = (
+            shift_type.get('code', shift_type['id']),
+            shift_type.get('durationMinutes', 0)
+        )
+    return shift_type_map
 
 
-def summarize_assignments(request: dict, response: dict) -> Tuple[Dict[str, int], Dict[Tuple[str, str, str], int]]:
-    """Summarize assignments by staff and by cell."""
-    staff_minutes = defaultdict(int)  # staffId -> total_minutes
-    cell_assignments = defaultdict(int)  # (date, wardId, slot) -> assigned_count
+def intern_column(values: List[str]) -> Tuple[Dict[str, int], np.ndarray]:
+    """Id of each distinct value (in sorted order) and the id of every row, from one np.unique."""
+    distinct, row_ids = np.unique(np.array(values, dtype=str), return_inverse=True)
+    return {value: i for i, value in enumerate(distinct.tolist())}, row_ids.ravel().astype(np.int64)
+
+
+def build_demand_index(request: dict) -> DemandIndex:
+    """Build demand index."""
+    demand_rows = request.get('demand', [])
+    
+    # Intern dates, wards and slots to small ints, one np.unique per column
+    date_ids, row_date = intern_column([demand['date'] for demand in demand_rows])
+    ward_ids, row_ward = intern_column([demand['wardId'] for demand in demand_rows])
+    slot_ids, row_slot = intern_column([demand['slot'] for demand in demand_rows])
+    
+    # Sum all skill requirements for each row
+    row_required = np.fromiter(
+        (sum(requirements.values()) if isinstance(requirements, dict) else 0
+         for requirements in (demand.get('requirements', {}) for demand in demand_rows)),
+        dtype=np.int64, count=len(demand_rows)
+    )
+    
+    # Merge rows for the same cell, numbering cells in first-seen order
+    row_key = pack_cell_keys(row_date, row_ward, row_slot, len(ward_ids), len(slot_ids))
+    sorted_keys, first_row, row_to_unique = np.unique(row_key, return_index=True, return_inverse=True)
+    order = np.argsort(first_row)
+    unique_to_cell = np.empty_like(order)
+    unique_to_cell[order] = np.arange(order.size)
+    row_to_cell = unique_to_cell[row_to_unique.ravel()]
+    first_row = first_row[order]
+    
+    return DemandIndex(
+        date_ids=date_ids,
+        ward_ids=ward_ids,
+        slot_ids=slot_ids,
+        date_id=row_date[first_row],
+        ward_id=row_ward[first_row],
+        slot_id=row_slot[first_row],
+        required=np.bincount(row_to_cell, weights=row_required, minlength=order.size).astype(np.int64),
+        sorted_keys=sorted_keys,
+        sorted_cells=unique_to_cell,
+    )
+
+
+def summarize_assignments(response: dict, shift_type_map: Dict[str, Tuple[str, int]],
+                          demand_index: DemandIndex) -> Tuple[List[str], np.ndarray, np.ndarray, int]:
+    """Summarize assignments by staff and by demand cell.
     
-    # Build shift type mapping for slot resolution
-    shift_type_map = {}  # shiftTypeId -> slot
-    for shift_type in request.get('shiftTypes', []):
-        shift_type_map[shift_type['id']] = shift_type.get('code', shift_type['id'])
+    Returns staff ids with their total minutes as a parallel int64 array, the
+    assigned count of each demand cell and the total number of assignments
+    (including those outside any demand cell).
+    """
+    staff_ids = {}  # staffId -> staff position, in first-seen order
     
     assignments = response.get('assignments', [])
     
-    for assignment in assignments:
-        staff_id = assignment['staffId']
-        date = assignment['date']
-        ward_id = assignment['wardId']
+    # Staff position and duration of each assignment
+    row_staff = np.empty(len(assignments), dtype=np.int64)
+    row_minutes = np.empty(len(assignments), dtype=np.int64)
+    # Interned ids of each assignment's cell, -1 where demand never mentions it
+    row_date = np.empty(len(assignments), dtype=np.int64)
+    row_ward = np.empty(len(assignments), dtype=np.int64)
+    row_slot = np.empty(len(assignments), dtype=np.int64)
+    
+    for i, assignment in enumerate(assignments):
         shift_type_id = assignment.get('shiftTypeId', '')
         
-        # Resolve slot from shiftTypeId
-        slot = shift_type_map.get(shift_type_id, shift_type_id)
+        # Resolve slot and duration from shiftTypeId
+        slot, duration_minutes = shift_type_map.get(shift_type_id, (shift_type_id, 0))
         
-        # Add to staff minutes
-        duration_minutes = 0
-        for shift_type in request.get('shiftTypes', []):
-            if shift_type['id'] == shift_type_id:
-                duration_minutes = shift_type.get('durationMinutes', 0)
-                break
-        
-        staff_minutes[staff_id] += duration_minutes
+        # Record for staff minutes
+        row_staff[i] = staff_ids.setdefault(assignment['staffId'], len(staff_ids))
+        row_minutes[i] = duration_minutes
         
         # Add to cell assignments
-        cell_key = (date, ward_id, slot)
-        cell_assignments[cell_key] += 1
+        row_date[i] = demand_index.date_ids.get(assignment['date'], -1)
+        row_ward[i] = demand_index.ward_ids.get(assignment['wardId'], -1)
+        row_slot[i] = demand_index.slot_ids.get(slot, -1)
+    
+    # Count assignments per demand cell through the packed cell keys
+    cells = demand_index.cells_of(row_date, row_ward, row_slot)
+    cell_assigned = np.bincount(cells[cells >= 0], minlength=demand_index.required.size)
     
-    return dict(staff_minutes), dict(cell_assignments)
+    # Sum minutes per staff member in one reduction
+    staff_minutes = np.bincount(row_staff, weights=row_minutes, minlength=len(staff_ids)).astype(np.int64)
+    
+    return list(staff_ids), staff_minutes, cell_assigned, len(assignments)
+
 
+@njit(cache=True)
+def _fairness_kernel(hours_sorted):
+    """Max, min, mean, population std dev and Gini of sorted hours"""
+    n = hours_sorted.shape[0]
+    total = 0.0
+    weighted_sum = 0.0
+    for i in range(n):
+        x = hours_sorted[i]
+        total += x
+        weighted_sum += (i + 1) * x
+    mean = total / n
+    
+    # Squared deviations from the mean rather than E[x^2] - mean^2, which
+    # cancels badly and can flip the rounding of the reported std dev
+    sum_sq_dev = 0.0
+    for i in range(n):
+        sum_sq_dev += (hours_sorted[i] - mean) ** 2
+    variance = sum_sq_dev / n
+    gini = 0.0 if total == 0 else (2 * weighted_sum) / (n * total) - (n + 1) / n
+    return hours_sorted[n - 1], hours_sorted[0], mean, np.sqrt(variance), gini
 
-def fairness_stats(hours_by_staff: Dict[str, float]) -> Dict[str, float]:
+
+def fairness_stats(hours: np.ndarray) -> Dict[str, float]:
     """Calculate fairness statistics including Gini coefficient."""
-    if not hours_by_staff:
+    if not hours.size:
         return {
             'max_hours': 0.0, 'min_hours': 0.0, 'range_hours': 0.0,
             'mean_hours': 0.0, 'stddev_hours': 0.0, 'gini': 0.0
         }
     
-    hours_list = list(hours_by_staff.values())
-    hours_list.sort()
-    
-    max_hours = max(hours_list)
-    min_hours = min(hours_list)
-    range_hours = max_hours - min_hours
-    mean_hours = sum(hours_list) / len(hours_list)
-    
-    # Population standard deviation
-    variance = sum((x - mean_hours) ** 2 for x in hours_list) / len(hours_list)
-    stddev_hours = math.sqrt(variance)
-    
-    # Gini coefficient
-    n = len(hours_list)
-    if n == 0 or sum(hours_list) == 0:
-        gini = 0.0
-    else:
-        cumsum = 0
-        for i, x in enumerate(hours_list):
-            cumsum += (i + 1) * x
-        gini = (2 * cumsum) / (n * sum(hours_list)) - (n + 1) / n
+    hours_sorted = np.sort(hours.astype(np.float64))
+    max_hours, min_hours, mean_hours, stddev_hours, gini = _fairness_kernel(hours_sorted)
     
     return {
-        'max_hours': max_hours,
-        'min_hours': min_hours,
-        'range_hours': range_hours,
-        'mean_hours': mean_hours,
-        'stddev_hours': stddev_hours,
-        'gini': gini
+        'max_hours': float(max_hours),
+        'min_hours': float(min_hours),
+        'range_hours': float(max_hours - min_hours),
+        'mean_hours': float(mean_hours),
+        'stddev_hours': float(stddev_hours),
+        'gini': float(gini)
     }
 
 
-def write_csv(rows: List[Dict], path: str):
-    """Write rows to CSV file."""
-    if not rows:
+def write_csv(columns: Dict[str, List], path: str):
+    """Write equal-length columns to CSV file, one header per column."""
+    if not columns or not len(next(iter(columns.values()))):
         return
     
     os.makedirs(os.path.dirname(path), exist_ok=True)
     
-    with open(path, 'w') as f:
+    # csv quotes values containing commas or newlines; one large buffer keeps
+    # writes to a few syscalls
+    with open(path, 'w', newline='', buffering=1 << 20) as f:
+        writer = csv.writer(f, lineterminator='\n')
+        
         # Write header
-        headers = list(rows[0].keys())
-        f.write(','.join(headers) + '\n')
+        writer.writerow(columns.keys())
         
-        # Write rows
-        for row in rows:
-            values = [str(row.get(header, '')) for header in headers]
-            f.write(','.join(values) + '\n')
+        # Write rows, zipped straight from the columns
+        writer.writerows(zip(*columns.values()))
 
 
 def fmt_hours(minutes: int) -> str:
@@ -161,43 +279,40 @@ def fmt_hours(minutes: int) -> str:
     return f"{hours:.1f}"
 
 
-def main():
-    """Main validation function."""
-    parser = argparse.ArgumentParser(description='Validate MediRota solver solution')
-    parser.add_argument('--request', default='./solver_request.json', help='Path to request JSON')
-    parser.add_argument('--response', default='./solver_response.json', help='Path to response JSON')
-    parser.add_argument('--outdir', default='./debug_out', help='Output directory for CSV files')
-    
-    args = parser.parse_args()
+def validate(request_path: str, response_path: str, outdir: Optional[str]) -> int:
+    """Print the validation report and write CSVs; return the exit code.
     
+    CSV snapshots are skipped entirely when outdir is None.
+    """
     # Load JSON files
-    print(f"Loading request from: {args.request}")
-    print(f"Loading response from: {args.response}")
+    print(f"Loading request from: {request_path}")
+    print(f"Loading response from: {response_path}")
     print()
     
-    request = load_json(args.request)
-    response = load_json(args.response)
+    request = load_json(request_path)
+    response = load_json(response_path)
+    intern_columns(request.get('demand', []), ('date', 'wardId', 'slot'))
+    intern_columns(response.get('assignments', []), ('staffId', 'date', 'wardId', 'shiftTypeId'))
+    
+    # Build shift type mapping and demand index
+    shift_type_map = build_shift_type_map(request)
+    demand_index = build_demand_index(request)
     
-    # Build demand index and shift type mapping
-    demand_index, shift_types = build_demand_index(request)
+    # Summarize assignments; assigned counts are aligned with the demand cells
+    staff_ids, staff_minutes, cell_assigned, total_assigned = summarize_assignments(response, shift_type_map, demand_index)
+    cell_keys = demand_index.cell_keys()
     
-    # Summarize assignments
-    staff_minutes, cell_assignments = summarize_assignments(request, response)
+    # Unmet demand of each cell, shared by the top-unmet report and the cell CSV
+    cell_unmet = np.maximum(demand_index.required - cell_assigned, 0)
     
     # Calculate totals
-    total_required = sum(demand_index.values())
-    total_assigned = sum(cell_assignments.values())
+    total_required = int(demand_index.required.sum())
     total_unmet = max(0, total_required - total_assigned)
     
-    # Get distinct values
-    distinct_dates = set()
-    distinct_wards = set()
-    distinct_slots = set()
-    
-    for (date, ward_id, slot) in demand_index.keys():
-        distinct_dates.add(date)
-        distinct_wards.add(ward_id)
-        distinct_slots.add(slot)
+    # Distinct values are the sizes of the interned columns
+    distinct_dates = demand_index.date_ids
+    distinct_wards = demand_index.ward_ids
+    distinct_slots = demand_index.slot_ids
     
     # Print OVERVIEW section
     print("=" * 60)
@@ -217,9 +332,9 @@ def main():
     print("=" * 60)
     
     # Convert minutes to hours for staff
-    staff_hours = {staff_id: minutes / 60.0 for staff_id, minutes in staff_minutes.items()}
+    staff_hours = staff_minutes / 60.0
     
-    if staff_hours:
+    if staff_hours.size:
         fairness = fairness_stats(staff_hours)
         
         print(f"Max Hours:          {fairness['max_hours']:>8.1f}")
@@ -232,13 +347,20 @@ def main():
         
         # Top 10 staff by hours
         print("Top 10 Staff by Hours:")
-        sorted_staff = sorted(staff_hours.items(), key=lambda x: x[1], reverse=True)
-        for i, (staff_id, hours) in enumerate(sorted_staff[:10], 1):
-            minutes = staff_minutes[staff_id]
-            print(f"  {i:2d}. {staff_id:<15} {hours:>6.1f}h ({minutes:>5d}m)")
+        top_staff = np.arange(staff_minutes.size)
+        if top_staff.size > 10:
+            # Only staff at least as busy as the 10th can be listed; ties with
+            # it stay in so the first-seen tie-break below is exact
+            threshold = np.partition(staff_minutes, staff_minutes.size - 10)[staff_minutes.size - 10]
+            top_staff = np.flatnonzero(staff_minutes >= threshold)
+        minutes_by_staff = staff_minutes.tolist()
+        top_staff = sorted(top_staff.tolist(), key=lambda s: -minutes_by_staff[s])[:10]
+        for i, s in enumerate(top_staff, 1):
+            minutes = minutes_by_staff[s]
+            print(f"  {i:2d}. {staff_ids[s]:<15} {minutes / 60.0:>6.1f}h ({minutes:>5d}m)")
     else:
         print("No assignments found - all fairness metrics are 0")
-        fairness = fairness_stats({})
+        fairness = fairness_stats(staff_hours)
     
     print()
     
@@ -247,25 +369,29 @@ def main():
     print("TOP UNMET CELLS")
     print("=" * 60)
     
-    # Calculate unmet per cell
-    cell_unmet = []
-    for (date, ward_id, slot), required in demand_index.items():
-        assigned = cell_assignments.get((date, ward_id, slot), 0)
-        unmet = max(0, required - assigned)
-        if unmet > 0:
-            cell_unmet.append((date, ward_id, slot, required, assigned, unmet))
+    # Cells with unmet demand
+    unmet_cells = np.flatnonzero(cell_unmet)
+    n_unmet_cells = unmet_cells.size
+    if n_unmet_cells > 15:
+        # Only cells at least as short as the 15th largest can be listed;
+        # ties with it stay in so the date tie-break below is exact
+        threshold = np.partition(cell_unmet[unmet_cells], n_unmet_cells - 15)[n_unmet_cells - 15]
+        unmet_cells = unmet_cells[cell_unmet[unmet_cells] >= threshold]
     
-    # Sort by unmet desc, then date
-    cell_unmet.sort(key=lambda x: (-x[5], x[0]))
+    # Sort by unmet desc, then date, and keep the top 15
+    unmet_by_cell = cell_unmet.tolist()
+    top_cells = sorted(unmet_cells.tolist(), key=lambda c: (-unmet_by_cell[c], cell_keys[c][0]))[:15]
     
     print(f"{'Date':<12} {'Ward':<8} {'Slot':<8} {'Required':>8} {'Assigned':>8} {'Unmet':>8}")
     print("-" * 60)
     
-    for date, ward_id, slot, required, assigned, unmet in cell_unmet[:15]:
+    for c in top_cells:
+        date, ward_id, slot = cell_keys[c]
+        required, assigned, unmet = int(demand_index.required[c]), int(cell_assigned[c]), unmet_by_cell[c]
         print(f"{date:<12} {ward_id:<8} {slot:<8} {required:>8} {assigned:>8} {unmet:>8}")
     
-    if len(cell_unmet) > 15:
-        print(f"... and {len(cell_unmet) - 15} more cells with unmet demand")
+    if n_unmet_cells > 15:
+        print(f"... and {n_unmet_cells - 15} more cells with unmet demand")
     
     print()
     
@@ -274,21 +400,29 @@ def main():
     print("PER-DATE SUMMARY")
     print("=" * 60)
     
-    # Aggregate by date
-    date_summary = defaultdict(lambda: {'required': 0, 'assigned': 0})
-    
-    for (date, ward_id, slot), required in demand_index.items():
-        assigned = cell_assignments.get((date, ward_id, slot), 0)
-        date_summary[date]['required'] += required
-        date_summary[date]['assigned'] += assigned
+    # Aggregate by date straight from the cell arrays
+    dates = list(demand_index.date_ids)
+    required_by_date = np.bincount(demand_index.date_id, weights=demand_index.required, minlength=len(dates)).astype(np.int64)
+    assigned_by_date = np.bincount(demand_index.date_id, weights=cell_assigned, minlength=len(dates)).astype(np.int64)
+    unmet_by_date = np.maximum(required_by_date - assigned_by_date, 0)
+    
+    # One row per date in calendar order, shared by the printout and the CSV
+    date_order = sorted(range(len(dates)), key=dates.__getitem__)
+    date_rows = [
+        (dates[i], required, assigned, unmet)
+        for i, required, assigned, unmet in zip(
+            date_order,
+            required_by_date[date_order].tolist(),
+            assigned_by_date[date_order].tolist(),
+            unmet_by_date[date_order].tolist()
+        )
+    ]
     
     print(f"{'Date':<12} {'Required':>8} {'Assigned':>8} {'Unmet':>8}")
     print("-" * 40)
     
-    for date in sorted(date_summary.keys()):
-        summary = date_summary[date]
-        unmet = max(0, summary['required'] - summary['assigned'])
-        print(f"{date:<12} {summary['required']:>8} {summary['assigned']:>8} {unmet:>8}")
+    for date, required, assigned, unmet in date_rows:
+        print(f"{date:<12} {required:>8} {assigned:>8} {unmet:>8}")
     
     print()
     
@@ -297,52 +431,41 @@ def main():
     print("CSV SNAPSHOTS")
     print("=" * 60)
     
-    # Staff hours CSV
-    staff_csv_rows = []
-    for staff_id, minutes in staff_minutes.items():
-        staff_csv_rows.append({
-            'staffId': staff_id,
-            'minutes': minutes,
-            'hours': round(minutes / 60.0, 1)
-        })
-    
-    staff_csv_path = os.path.join(args.outdir, 'staff_hours.csv')
-    write_csv(staff_csv_rows, staff_csv_path)
-    print(f"Staff hours: {staff_csv_path}")
-    
-    # Per-cell coverage CSV
-    cell_csv_rows = []
-    for (date, ward_id, slot), required in demand_index.items():
-        assigned = cell_assignments.get((date, ward_id, slot), 0)
-        unmet = max(0, required - assigned)
-        cell_csv_rows.append({
-            'date': date,
-            'wardId': ward_id,
-            'slot': slot,
-            'required': required,
-            'assigned': assigned,
-            'unmet': unmet
-        })
-    
-    cell_csv_path = os.path.join(args.outdir, 'per_cell_coverage.csv')
-    write_csv(cell_csv_rows, cell_csv_path)
-    print(f"Per-cell coverage: {cell_csv_path}")
-    
-    # Per-date coverage CSV
-    date_csv_rows = []
-    for date in sorted(date_summary.keys()):
-        summary = date_summary[date]
-        unmet = max(0, summary['required'] - summary['assigned'])
-        date_csv_rows.append({
-            'date': date,
-            'required': summary['required'],
-            'assigned': summary['assigned'],
-            'unmet': unmet
-        })
-    
-    date_csv_path = os.path.join(args.outdir, 'per_date_coverage.csv')
-    write_csv(date_csv_rows, date_csv_path)
-    print(f"Per-date coverage: {date_csv_path}")
+    if outdir is None:
+        print("CSV output skipped")
+    else:
+        # Staff hours CSV
+        staff_csv_path = os.path.join(outdir, 'staff_hours.csv')
+        write_csv({
+            'staffId': staff_ids,
+            'minutes': staff_minutes.tolist(),
+            'hours': [round(minutes / 60.0, 1) for minutes in staff_minutes.tolist()]
+        }, staff_csv_path)
+        print(f"Staff hours: {staff_csv_path}")
+        
+        # Per-cell coverage CSV
+        cell_dates, cell_wards, cell_slots = zip(*cell_keys) if cell_keys else ((), (), ())
+        cell_csv_path = os.path.join(outdir, 'per_cell_coverage.csv')
+        write_csv({
+            'date': cell_dates,
+            'wardId': cell_wards,
+            'slot': cell_slots,
+            'required': demand_index.required.tolist(),
+            'assigned': cell_assigned.tolist(),
+            'unmet': cell_unmet.tolist()
+        }, cell_csv_path)
+        print(f"Per-cell coverage: {cell_csv_path}")
+        
+        # Per-date coverage CSV
+        date_names, date_required, date_assigned, date_unmet = zip(*date_rows) if date_rows else ((), (), (), ())
+        date_csv_path = os.path.join(outdir, 'per_date_coverage.csv')
+        write_csv({
+            'date': date_names,
+            'required': date_required,
+            'assigned': date_assigned,
+            'unmet': date_unmet
+        }, date_csv_path)
+        print(f"Per-date coverage: {date_csv_path}")
     
     print()
     print("=" * 60)
@@ -351,10 +474,36 @@ def main():
     
     if total_unmet > 0:
         print(f"❌ Solution has {total_unmet} unmet demand items")
-        sys.exit(2)
+        return 2
     else:
         print("✅ Solution fully satisfies all demand requirements")
-        sys.exit(0)
+        return 0
+
+
+def run(request_path: str, response_path: str, outdir: Optional[str]) -> Tuple[int, str]:
+    """Validate a solution in-process; return the exit code and report text."""
+    buffer = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(buffer):
+            code = validate(request_path, response_path, outdir)
+    except BaseException:
+        # Surface the partial report before propagating the failure
+        sys.stdout.write(buffer.getvalue())
+        raise
+    return code, buffer.getvalue()
+
+
+def main():
+    """Main validation function."""
+    parser = argparse.ArgumentParser(description='Validate MediRota solver solution')
+    parser.add_argument('--request', default='./solver_request.json', help='Path to request JSON')
+    parser.add_argument('--response', default='./solver_response.json', help='Path to response JSON')
+    parser.add_argument('--outdir', default='./debug_out', help='Output directory for CSV files')
+    parser.add_argument('--no-csv', action='store_true', help='Skip writing CSV snapshots')
+    
+    args = parser.parse_args()
+    
+    sys.exit(validate(args.request, args.response, None if args.no_csv else args.outdir))
 
 
 if __name__ == "__main__":